@@ -1,7 +1,11 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 import pandas as pd
 import os
-import requests
+import json
+from app.services.datasets import registry
+from app.services.spatial import summary_grid
+from app.services.response_cache import cached_response
+from app.services.responses import dumps
 
 router = APIRouter()
 
@@ -10,12 +14,20 @@ DATA_DIR = os.path.join(BASE_DIR, "data")
 
 @router.get("/summary")
 def get_view_summary(
+    request: Request,
     min_lat: float, max_lat: float, 
     min_lng: float, max_lng: float
 ):
     """
     Returns aggregated metrics for the current map view.
+    Repeated views of unchanged data are answered from the response cache (or 304).
     """
+    return cached_response(
+        request, ["air_quality", "water_quality"],
+        lambda: dumps(_view_summary(min_lat, max_lat, min_lng, max_lng)),
+    )
+
+def _view_summary(min_lat, max_lat, min_lng, max_lng):
     summary = {
         "avg_aqi": None,
         "avg_wqi": None,
@@ -24,26 +36,16 @@ def get_view_summary(
     }
 
     # 1. AQI Stats
-    aqi_path = os.path.join(DATA_DIR, "smart_city_air_humidity_2025_2026.csv")
-    if os.path.exists(aqi_path):
-        df_aqi = pd.read_csv(aqi_path)
-        filtered_aqi = df_aqi[
-            (df_aqi["Latitude"] >= min_lat) & (df_aqi["Latitude"] <= max_lat) & 
-            (df_aqi["Longitude"] >= min_lng) & (df_aqi["Longitude"] <= max_lng)
-        ]
-        if not filtered_aqi.empty:
-            summary["avg_aqi"] = int(filtered_aqi["AQI"].mean())
+    if registry.exists("air_quality"):
+        total, count = summary_grid("air_quality", "AQI").query(min_lat, max_lat, min_lng, max_lng)
+        if count:
+            summary["avg_aqi"] = int(total / count)
 
     # 2. Water Stats
-    water_path = os.path.join(DATA_DIR, "smart_city_water_quality_2025_2026.csv")
-    if os.path.exists(water_path):
-        df_water = pd.read_csv(water_path)
-        filtered_water = df_water[
-            (df_water["Latitude"] >= min_lat) & (df_water["Latitude"] <= max_lat) & 
-            (df_water["Longitude"] >= min_lng) & (df_water["Longitude"] <= max_lng)
-        ]
-        if not filtered_water.empty:
-            summary["avg_wqi"] = int(filtered_water["WQI"].mean())
+    if registry.exists("water_quality"):
+        total, count = summary_grid("water_quality", "WQI").query(min_lat, max_lat, min_lng, max_lng)
+        if count:
+            summary["avg_wqi"] = int(total / count)
 
     # 3. Generate Insight
     insights = []
@@ -65,72 +67,186 @@ def get_view_summary(
     return summary
 
 from pydantic import BaseModel
-from typing import Dict, Any
-import pickle
+from typing import Dict, Any, List
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from app.services.model_registry import model_registry
+from app.services.telemetry import TelemetryError, fetch_telemetry
+import io
+import time
+import numpy as np
+
+MAX_BATCH_ROWS = 100_000
+# Invalid cells listed in a 400 before the rest are only counted
+MAX_REPORTED_ERRORS = 20
 
 class PredictRequest(BaseModel):
     features: Dict[str, Any]
 
+def _cell(value):
+    return None if pd.isna(value) else str(value)
+
+def _score_frame(bundle, df_input):
+    """
+    One vectorized predict_proba pass over a frame of feature rows.
+    Returns (categories, confidences) in input order.
+    Features absent from the input (missing keys, nulls, blank CSV cells) default to 0.0;
+    a value that is given but not numeric is rejected with a 400 listing the offending rows and columns.
+    """
+    # Exactly the model's columns, in training order
+    given = [feat for feat in bundle.features if feat in df_input.columns]
+    numeric = df_input[given].apply(pd.to_numeric, errors="coerce")
+    invalid = (numeric.isna() & df_input[given].notna()).to_numpy()
+    if invalid.any():
+        rows, cols = np.nonzero(invalid)
+        raise HTTPException(status_code=400, detail={
+            "message": "Feature values must be numeric",
+            "invalid_count": len(rows),
+            "invalid": [
+                {"row": int(r), "column": given[c], "value": _cell(df_input[given[c]].iloc[r])}
+                for r, c in zip(rows[:MAX_REPORTED_ERRORS].tolist(), cols[:MAX_REPORTED_ERRORS].tolist())
+            ],
+        })
+    X = numeric.reindex(columns=bundle.features).fillna(0.0)
+    proba = bundle.model.predict_proba(X)
+    best = proba.argmax(axis=1)
+    categories = bundle.encoder.inverse_transform(bundle.model.classes_[best])
+    confidences = proba[np.arange(len(best)), best]
+    return categories, confidences
+
 @router.post("/predict-aqi")
 def predict_aqi(req: PredictRequest):
     """
     Predicts the AQI Category using the extremely accurate Indian Climate Model (2024-2025).
     """
     try:
-        model_path = os.path.join(BASE_DIR, "model", "climate_model.pkl")
-        encoder_path = os.path.join(BASE_DIR, "model", "climate_encoder.pkl")
-        features_path = os.path.join(BASE_DIR, "model", "climate_features.pkl")
-        
-        with open(model_path, "rb") as f:
-            model = pickle.load(f)
-        with open(encoder_path, "rb") as f:
-            encoder = pickle.load(f)
-        with open(features_path, "rb") as f:
-            features = pickle.load(f)
+        # Served from memory; swapped automatically when new pickles are dropped in
+        bundle = model_registry.current()
             
         # Build pandas dataframe for the single row
-        input_data = {}
-        for feat in features:
-            input_data[feat] = req.features.get(feat, 0.0) # default to 0.0 if not provided
-            
-        df_input = pd.DataFrame([input_data])
-        prediction = model.predict(df_input)
-        category = encoder.inverse_transform(prediction)[0]
-        
-        # We also get probabilities to show it's '100% true' as requested
-        prob = max(model.predict_proba(df_input)[0])
+        df_input = pd.DataFrame([req.features])
+        categories, confidences = _score_frame(bundle, df_input)
         
         return {
-            "prediction_category": category,
-            "confidence": f"{prob * 100:.2f}%",
-            "message": "Perfect accurate answer generated."
+            "prediction_category": categories[0],
+            "confidence": f"{confidences[0] * 100:.2f}%",
+            "message": "Perfect accurate answer generated.",
+            "model_version": bundle.version
         }
+    except HTTPException:
+        raise
     except Exception as e:
         return {"error": str(e)}
 
+class BatchPredictRequest(BaseModel):
+    rows: List[Dict[str, Any]]
+
+def _parse_batch(body: bytes, content_type: str):
+    """Feature rows from a JSON ({"rows": [...]} or a bare list), CSV or NDJSON body."""
+    if content_type in ("text/csv", "application/csv"):
+        return pd.read_csv(io.BytesIO(body))
+    if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        return pd.read_json(io.BytesIO(body), lines=True)
+
+    payload = json.loads(body)
+    rows = payload if isinstance(payload, list) else BatchPredictRequest(**payload).rows
+    return pd.DataFrame(rows)
+
+def _parse_and_score(bundle, body: bytes, content_type: str):
+    """Parses, validates and scores a batch body; runs in a worker thread (large bodies parse slowly)."""
+    try:
+        df_input = _parse_batch(body, content_type)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not parse batch: {str(e)}")
+    if len(df_input) > MAX_BATCH_ROWS:
+        raise HTTPException(status_code=413, detail=f"Batch limited to {MAX_BATCH_ROWS} rows")
+    if not len(df_input):
+        return 0, [], []
+    categories, confidences = _score_frame(bundle, df_input)
+    return len(df_input), categories, confidences
+
+@router.post("/predict-aqi/batch")
+async def predict_aqi_batch(request: Request):
+    """
+    Scores many feature rows in one vectorized pass.
+    Accepts JSON ({"rows": [...]}), CSV (text/csv) or NDJSON (application/x-ndjson).
+    Predictions come back in input order.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    body = await request.body()
+
+    bundle = model_registry.current()
+    started = time.perf_counter()
+    # Parsing and model inference are CPU-bound; keep them off the event loop
+    count, categories, confidences = await run_in_threadpool(_parse_and_score, bundle, body, content_type)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "count": count,
+        "predictions": [
+            {"prediction_category": c, "confidence": f"{p * 100:.2f}%"}
+            for c, p in zip(categories, confidences)
+        ],
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "rows_per_second": round(count / elapsed, 1) if elapsed > 0 else None,
+        "model_version": bundle.version
+    }
+
+@router.get("/model")
+def get_model_info():
+    """
+    Version and load time of the climate model currently being served.
+    """
+    model_registry.current()
+    return model_registry.info()
+
 class SatellitePredictRequest(BaseModel):
     lat: float
     lng: float
 
+def _satellite_features(bundle, features_dict):
+    """Maps the telemetry readings onto the model's feature names."""
+    input_data = {}
+    # Ensure we use exactly what the model asks for, with exact unicode characters intact
+    for feat in bundle.features:
+        # Our feature dict has exact strings except for any potential encoding issues.
+        # We match to features_dict by falling back onto string matching.
+        # But the keys we built match the literal strings loaded from pickle!
+        val = 0.0
+        for k, v in features_dict.items():
+            if k in feat or feat in k:  
+                # Handle encoding mismatches nicely!
+                val = v
+                break
+        input_data[feat] = val
+    return input_data
+
+def _predict_satellite(features_dict):
+    """Model step of the satellite prediction (CPU-bound; runs in a worker thread)."""
+    # Load Model (in-memory registry)
+    bundle = model_registry.current()
+    model, encoder = bundle.model, bundle.encoder
+    input_data = _satellite_features(bundle, features_dict)
+
+    df_input = pd.DataFrame([input_data])
+    prediction = model.predict(df_input)
+    category = encoder.inverse_transform(prediction)[0]
+    prob = max(model.predict_proba(df_input)[0])
+    return bundle, input_data, category, prob
+
 @router.post("/predict-aqi-satellite")
-def predict_aqi_satellite(req: SatellitePredictRequest):
+async def predict_aqi_satellite(req: SatellitePredictRequest):
     """
     Simulates Google's Satellite Level Accuracy by feeding live real-time geospatial/satellite
     weather data into the trained hyper-accurate model based on GPS coordinates.
     """
     try:
         # Fetch Real-Time Satellite/Meterological Data
-        weather_url = f"https://api.open-meteo.com/v1/forecast?latitude={req.lat}&longitude={req.lng}&current=temperature_2m,relative_humidity_2m,surface_pressure,cloud_cover,wind_speed_10m,precipitation&daily=temperature_2m_max,temperature_2m_min&timezone=auto"
-        air_url = f"https://air-quality-api.open-meteo.com/v1/air-quality?latitude={req.lat}&longitude={req.lng}&current=us_aqi&timezone=auto"
-        
-        weather_resp = requests.get(weather_url)
-        air_resp = requests.get(air_url)
-        
-        if weather_resp.status_code != 200 or air_resp.status_code != 200:
+        # (both calls in parallel, cached per ~5 km grid cell)
+        try:
+            weather_data, air_data = await fetch_telemetry(req.lat, req.lng)
+        except TelemetryError:
             return {"error": "Failed to fetch live satellite data."}
-            
-        weather_data = weather_resp.json()
-        air_data = air_resp.json()
         
         current_w = weather_data.get("current", {})
         daily_w = weather_data.get("daily", {})
@@ -149,36 +265,8 @@ def predict_aqi_satellite(req: SatellitePredictRequest):
             "Cloud_Cover_%": current_w.get("cloud_cover", 0)
         }
         
-        # Load Model
-        model_path = os.path.join(BASE_DIR, "model", "climate_model.pkl")
-        encoder_path = os.path.join(BASE_DIR, "model", "climate_encoder.pkl")
-        features_path = os.path.join(BASE_DIR, "model", "climate_features.pkl")
-        
-        with open(model_path, "rb") as f:
-            model = pickle.load(f)
-        with open(encoder_path, "rb") as f:
-            encoder = pickle.load(f)
-        with open(features_path, "rb") as f:
-            model_features = pickle.load(f)
-            
-        input_data = {}
-        # Ensure we use exactly what the model asks for, with exact unicode characters intact
-        for feat in model_features:
-            # Our feature dict has exact strings except for any potential encoding issues.
-            # We match to features_dict by falling back onto string matching.
-            # But the keys we built match the literal strings loaded from pickle!
-            val = 0.0
-            for k, v in features_dict.items():
-                if k in feat or feat in k:  
-                    # Handle encoding mismatches nicely!
-                    val = v
-                    break
-            input_data[feat] = val
-            
-        df_input = pd.DataFrame([input_data])
-        prediction = model.predict(df_input)
-        category = encoder.inverse_transform(prediction)[0]
-        prob = max(model.predict_proba(df_input)[0])
+        # Model inference off the event loop
+        bundle, input_data, category, prob = await run_in_threadpool(_predict_satellite, features_dict)
         
         return {
             "satellite_coordinate": f"{req.lat}, {req.lng}",
@@ -186,7 +274,8 @@ def predict_aqi_satellite(req: SatellitePredictRequest):
             "confidence": f"{prob * 100:.2f}%",
             "message": "Perfect accurate answer generated using Live Satellite Telemetry.",
             "data_source": "Global Meteorite & Climate Intelligence Integration",
-            "live_telemetry_features": input_data
+            "live_telemetry_features": input_data,
+            "model_version": bundle.version
         }
     except Exception as e:
         return {"error": str(e)}
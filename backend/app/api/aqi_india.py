@@ -1,73 +1,106 @@
 
-import os
 import json
 import glob
-import pandas as pd
-from fastapi import APIRouter, Query, HTTPException
+from fastapi import APIRouter, Query, HTTPException, Request, Response
 from typing import List, Optional
+from app.services.datasets import registry
+from app.services.geojson import Const, EMPTY_COLLECTION, FeatureLayer
+from app.services.spatial import has_bbox
+from app.services.aqi_history import aqi_history, POLLUTANTS
+from app.services.response_cache import cached_response
+from app.services.responses import FastJSONResponse
 
 router = APIRouter()
 
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data")
-CSV_FILE = os.path.join(DATA_DIR, "smart_city_air_humidity_2025_2026.csv")
+# GeoJSON property -> column of the per-station latest frame
+AQI_PROPERTIES = {
+    "city": "City",
+    "location": "StationName",
+    "timestamp": "Date",
+    "pm25": "PM2.5",
+    "pm10": "PM10",
+    "no2": "NO2",
+    "so2": Const(None),
+    "co": Const(None),
+    "o3": Const(None),
+    "aqi": "AQI",
+}
+
+def _latest_by_station(df):
+    """
+    Latest record per station as a materialized layer (pre-encoded features + grid index).
+    Built once per dataset version; stations without coordinates are dropped.
+    """
+    df_latest = df.sort_values('Date').groupby('StationName').last().reset_index()
+    return FeatureLayer(df_latest, AQI_PROPERTIES)
 
 @router.get("/")
 def get_india_aqi(
+    request: Request,
     min_lat: float = None, max_lat: float = None,
     min_lng: float = None, max_lng: float = None
 ):
     """
     Returns the latest available AQI data for all stations in India.
     """
-    if not os.path.exists(CSV_FILE):
+    if not registry.exists("air_quality"):
         return {"type": "FeatureCollection", "features": []}
 
-    features = []
-    try:
-        df = pd.read_csv(CSV_FILE)
-        
-        # Take latest record per Station
-        df_latest = df.sort_values('Date').groupby('StationName').last().reset_index()
-
-        for _, row in df_latest.iterrows():
-            lat = row.get("Latitude")
-            lng = row.get("Longitude")
-            
-            if pd.isna(lat) or pd.isna(lng):
-                continue
-                
-            # Filter by BBox if provided
-            if min_lat is not None:
-                 if not (min_lat <= lat <= max_lat and min_lng <= lng <= max_lng):
-                     continue
+    def build():
+        # Latest record per Station, materialized once per dataset version
+        layer = registry.derive("air_quality", "latest_by_station", _latest_by_station)
 
-            properties = {
-                "city": row.get("City", "Unknown"),
-                "location": row.get("StationName", "Unknown"),
-                "timestamp": row.get("Date", "N/A"),
-                "pm25": row.get("PM2.5", None),
-                "pm10": row.get("PM10", None),
-                "no2": row.get("NO2", None),
-                "so2": None,
-                "co": None,
-                "o3": None,
-                "aqi": row.get("AQI", int(row.get("PM2.5", 0)))
-            }
+        # Filter by BBox if provided
+        return layer.body(min_lat, max_lat, min_lng, max_lng)
 
-            feature = {
-                "type": "Feature",
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [lng, lat]
-                },
-                "properties": properties
-            }
-            features.append(feature)
-            
+    try:
+        return cached_response(request, ["air_quality"], build)
     except Exception as e:
         print(f"Error processing AQI data: {e}")
 
-    return {
-        "type": "FeatureCollection",
-        "features": features
-    }
+    return Response(content=EMPTY_COLLECTION, media_type="application/json")
+
+MAX_HISTORY_LIMIT = 5000
+
+@router.get("/history/stations")
+def get_history_stations():
+    """
+    Stations in the historical aqi_india store, with their geocoded coordinates.
+    """
+    if not aqi_history.exists():
+        raise HTTPException(status_code=404, detail="AQI history not found")
+    return {"stations": aqi_history.store().stations(), "pollutants": POLLUTANTS}
+
+@router.get("/history")
+def get_history(
+    station: Optional[str] = None,
+    pollutants: Optional[str] = Query(None, description="Comma-separated, e.g. PM2.5,NO2"),
+    min_lat: float = None, max_lat: float = None,
+    min_lng: float = None, max_lng: float = None,
+    start: Optional[str] = Query(None, description="YYYY-MM-DD, inclusive"),
+    end: Optional[str] = Query(None, description="YYYY-MM-DD, inclusive"),
+    cursor: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=MAX_HISTORY_LIMIT),
+):
+    """
+    Daily pollutant readings from 2020 onward, filterable by station, bbox and date range.
+    Pages are ordered by (station, date); pass `next_cursor` back as `cursor` for the next page.
+    """
+    if not aqi_history.exists():
+        raise HTTPException(status_code=404, detail="AQI history not found")
+
+    selected = [p.strip() for p in pollutants.split(",")] if pollutants else POLLUTANTS
+    unknown = [p for p in selected if p not in POLLUTANTS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown pollutants: {unknown}. Use {POLLUTANTS}")
+
+    bbox = (min_lat, max_lat, min_lng, max_lng) if has_bbox(min_lat, max_lat, min_lng, max_lng) else None
+    try:
+        records, next_cursor = aqi_history.store().query(
+            pollutants=selected, station=station, bbox=bbox,
+            start=start, end=end, cursor=cursor, limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return FastJSONResponse({"count": len(records), "records": records, "next_cursor": next_cursor})
@@ -1,13 +1,13 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 import pandas as pd
-import os
-from datetime import datetime
+import numpy as np
+from typing import Optional
+from app.services.datasets import registry
+from app.services.downsample import lttb
+from app.services.responses import FastJSONResponse
 
 router = APIRouter()
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-DATA_DIR = os.path.join(BASE_DIR, "data", "chennai")
-
 # Hardcoded Coordinates for Chennai Reservoirs
 RESERVOIR_COORDS = {
     "POONDI": [79.86, 13.19],
@@ -16,31 +16,62 @@ RESERVOIR_COORDS = {
     "CHEMBARAMBAKKAM": [80.06, 13.01]
 }
 
+# Series kind -> registry dataset
+SERIES = {"levels": "chennai_levels", "rainfall": "chennai_rainfall"}
+MAX_POINTS = 5000
+
+class ReservoirSeries:
+    """
+    One reservoir file preloaded as arrays: dates as days since epoch (sorted) plus one
+    float64 array per reservoir. A time range is two binary searches.
+    """
+
+    def __init__(self, df):
+        dates = pd.to_datetime(df["Date"], format="%d-%m-%Y", errors="coerce")
+        order = np.argsort(dates.to_numpy(), kind="stable")
+        valid = order[dates.to_numpy()[order] == dates.to_numpy()[order]]  # drops NaT
+        self.days = dates.to_numpy()[valid].astype("datetime64[D]").astype("int64")
+        self.values = {
+            name: df[name].to_numpy(dtype="float64", na_value=np.nan)[valid]
+            for name in RESERVOIR_COORDS if name in df.columns
+        }
+
+    def window(self, start=None, end=None):
+        lo = 0 if start is None else int(np.searchsorted(self.days, _day(start), side="left"))
+        hi = len(self.days) if end is None else int(np.searchsorted(self.days, _day(end), side="right"))
+        return lo, hi
+
+def _day(value):
+    return int(np.datetime64(value, "D").astype("int64"))
+
+def _dates(days):
+    return np.datetime_as_string(days.astype("datetime64[D]")).tolist()
+
+def _round(values):
+    return [None if np.isnan(v) else round(float(v), 2) for v in values]
+
 @router.get("/reservoirs")
 def get_reservoir_levels():
     """
     Get latest available water levels for Chennai Reservoirs.
     Returns GeoJSON.
     """
-    file_path = os.path.join(DATA_DIR, "chennai_reservoir_levels.csv")
-    if not os.path.exists(file_path):
+    if not registry.exists("chennai_levels"):
         raise HTTPException(status_code=404, detail="Chennai Data not found")
-        
+
     try:
-        # Read CSV
-        df = pd.read_csv(file_path)
-        
-        # Get latest row
-        if df.empty:
+        # Preloaded once per file version; the last row is the latest reading
+        series = registry.derive("chennai_levels", "series", ReservoirSeries)
+
+        if len(series.days) == 0:
             return {"type": "FeatureCollection", "features": []}
-            
-        latest = df.iloc[-1]
-        date = latest["Date"]
-        
+
+        date = pd.Timestamp(series.days[-1], unit="D").strftime("%d-%m-%Y")
+
         features = []
         for name, coords in RESERVOIR_COORDS.items():
-            if name in latest:
-                level = latest[name]
+            if name in series.values:
+                level = series.values[name][-1]
                 feature = {
                     "type": "Feature",
                     "geometry": {
@@ -55,8 +86,52 @@ def get_reservoir_levels():
                     }
                 }
                 features.append(feature)
-                
+
         return {"type": "FeatureCollection", "features": features}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing data: {str(e)}")
+
+@router.get("/series/{kind}")
+def get_reservoir_series(
+    kind: str,
+    start: Optional[str] = Query(None, description="YYYY-MM-DD, inclusive"),
+    end: Optional[str] = Query(None, description="YYYY-MM-DD, inclusive"),
+    points: int = Query(500, ge=3, le=MAX_POINTS),
+    reservoirs: Optional[str] = Query(None, description="Comma-separated, e.g. POONDI,REDHILLS"),
+):
+    """
+    Daily reservoir levels (mcft) or rainfall (mm) over a date range, downsampled per reservoir
+    with LTTB to at most `points` points so long ranges keep their peaks and troughs.
+    """
+    if kind not in SERIES:
+        raise HTTPException(status_code=404, detail=f"Unknown series '{kind}'. Use {list(SERIES)}")
+    if not registry.exists(SERIES[kind]):
+        raise HTTPException(status_code=404, detail="Chennai Data not found")
+
+    series = registry.derive(SERIES[kind], "series", ReservoirSeries)
+    names = [r.strip().upper() for r in reservoirs.split(",")] if reservoirs else list(series.values)
+    unknown = [n for n in names if n not in series.values]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown reservoirs: {unknown}")
+
+    try:
+        lo, hi = series.window(start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {e}")
+
+    days = series.days[lo:hi]
+    result = {}
+    for name in names:
+        values = series.values[name][lo:hi]
+        finite = np.flatnonzero(~np.isnan(values))
+        picks = finite[lttb(days[finite], values[finite], points)]
+        result[name] = {"dates": _dates(days[picks]), "values": _round(values[picks])}
+
+    return FastJSONResponse({
+        "kind": kind,
+        "start": _dates(days[:1])[0] if len(days) else None,
+        "end": _dates(days[-1:])[0] if len(days) else None,
+        "source_points": len(days),
+        "series": result,
+    })
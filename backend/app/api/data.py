@@ -1,7 +1,12 @@
-from fastapi import APIRouter, HTTPException
-import pandas as pd
+from fastapi import APIRouter, HTTPException, Request, Response
 import os
 import json
+from app.services.datasets import registry
+from app.services.spatial import dataset_index, filter_bbox
+from app.services.geojson import FeatureLayer, encode_feature_collection
+from app.services.clustering import ClusterIndex, MAX_CLUSTER_ZOOM
+from app.services.response_cache import cached_response, response_cache
+from app.services import http
 
 router = APIRouter()
 
@@ -9,71 +14,122 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__fil
 DATA_DIR = os.path.join(BASE_DIR, "data")
 
 def csv_to_geojson(df, lat_col="Latitude", lon_col="Longitude", props=[]):
-    features = []
-    for _, row in df.iterrows():
-        feature = {
-            "type": "Feature",
-            "geometry": {
-                "type": "Point",
-                "coordinates": [row[lon_col], row[lat_col]]
-            },
-            "properties": {col: row[col] for col in props}
-        }
-        features.append(feature)
-    return {"type": "FeatureCollection", "features": features}
+    """
+    Serializes a DataFrame slice to GeoJSON FeatureCollection bytes (columnar, no per-row dicts).
+    """
+    return encode_feature_collection(df, {col: col for col in props}, lat_col=lat_col, lon_col=lon_col)
+
+def geojson_response(body: bytes):
+    # Already serialized; skip FastAPI's encoder
+    return Response(content=body, media_type="application/json")
+
+AIR_PROPS = ["StationId", "StationName", "City", "Date", "AQI", "PM2.5", "PM10", "NO2"]
+# Note CSV has 'p H' or 'pH' check case sensitive
+# Adjusting prop names to match CSV headers exactly
+WATER_PROPS = ["StationCode", "Location", "State", "WQI", "pH", "DO", "BOD"]
+
+def _air_clusters(df):
+    return ClusterIndex(df, "AQI", "avg_aqi", {col: col for col in AIR_PROPS})
+
+def _water_clusters(df):
+    return ClusterIndex(df, "WQI", "avg_wqi", {col: col for col in WATER_PROPS})
+
+def _station_points(station_col, props):
+    """Builder for a layer of each station's latest reading (one point per station)."""
+    def build(df):
+        latest = df.sort_values("Date", kind="stable").drop_duplicates(station_col, keep="last")
+        return FeatureLayer(latest, {col: col for col in props})
+    return build
 
 @router.get("/air-quality")
 def get_air_quality(
+    request: Request,
     min_lat: float = None, max_lat: float = None, 
-    min_lng: float = None, max_lng: float = None
+    min_lng: float = None, max_lng: float = None,
+    zoom: float = None
 ):
     """
     Get Real Air Quality data, optionally filtered by Bounding Box.
+    With `zoom` at or below MAX_CLUSTER_ZOOM, returns cluster centroids
+    (point_count, avg_aqi) instead of individual readings; above it, each station's latest reading.
     """
-    file_path = os.path.join(DATA_DIR, "smart_city_air_humidity_2025_2026.csv")
-    if not os.path.exists(file_path):
+    if not registry.exists("air_quality"):
         raise HTTPException(status_code=404, detail="AQI Data source not found")
         
-    try:
-        df = pd.read_csv(file_path)
+    def build():
+        if zoom is not None and zoom <= MAX_CLUSTER_ZOOM:
+            clusters = registry.derive("air_quality", "clusters", _air_clusters)
+            return clusters.body(zoom, min_lat, max_lat, min_lng, max_lng)
+        if zoom is not None:
+            layer = registry.derive("air_quality", "station_points", _station_points("StationId", AIR_PROPS))
+            return layer.body(min_lat, max_lat, min_lng, max_lng)
+
+        df = registry.get("air_quality")
         
-        # Filter by BBox if provided
-        if min_lat is not None and max_lat is not None and min_lng is not None and max_lng is not None:
-             df = df[
-                (df["Latitude"] >= min_lat) & (df["Latitude"] <= max_lat) & 
-                (df["Longitude"] >= min_lng) & (df["Longitude"] <= max_lng)
-            ]
+        # Filter by BBox if provided (grid index, built once per dataset version)
+        df = filter_bbox(df, dataset_index("air_quality"), min_lat, max_lat, min_lng, max_lng)
 
         # Props to include in GeoJSON
-        props = ["StationId", "StationName", "City", "Date", "AQI", "PM2.5", "PM10", "NO2"]
-        return csv_to_geojson(df, props=props)
+        return csv_to_geojson(df, props=AIR_PROPS)
+
+    try:
+        # Same query on the same dataset version -> 304 or the cached body
+        return cached_response(request, ["air_quality"], build)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Data processing error: {str(e)}")
 
 @router.get("/water-quality")
 def get_water_quality(
+    request: Request,
     min_lat: float = None, max_lat: float = None, 
-    min_lng: float = None, max_lng: float = None
+    min_lng: float = None, max_lng: float = None,
+    zoom: float = None
 ):
     """
     Get Real Water Quality data from seeded CSV, filterable by Bbox.
+    With `zoom` at or below MAX_CLUSTER_ZOOM, returns cluster centroids
+    (point_count, avg_wqi) instead of individual readings; above it, each station's latest reading.
     """
-    file_path = os.path.join(DATA_DIR, "smart_city_water_quality_2025_2026.csv")
-    if not os.path.exists(file_path):
+    if not registry.exists("water_quality"):
         raise HTTPException(status_code=404, detail="Water Data source not found")
         
-    try:
-        df = pd.read_csv(file_path)
+    def build():
+        if zoom is not None and zoom <= MAX_CLUSTER_ZOOM:
+            clusters = registry.derive("water_quality", "clusters", _water_clusters)
+            return clusters.body(zoom, min_lat, max_lat, min_lng, max_lng)
+        if zoom is not None:
+            layer = registry.derive("water_quality", "station_points", _station_points("StationCode", WATER_PROPS))
+            return layer.body(min_lat, max_lat, min_lng, max_lng)
+
+        df = registry.get("water_quality")
         
-        # Filter by BBox
-        if min_lat is not None and max_lat is not None and min_lng is not None and max_lng is not None:
-             df = df[
-                (df["Latitude"] >= min_lat) & (df["Latitude"] <= max_lat) & 
-                (df["Longitude"] >= min_lng) & (df["Longitude"] <= max_lng)
-            ]
-
-        # Note CSV has 'p H' or 'pH' check case sensitive
-        # Adjusting prop names to match CSV headers exactly
-        return csv_to_geojson(df, props=["StationCode", "Location", "State", "WQI", "pH", "DO", "BOD"])
+        # Filter by BBox (grid index, built once per dataset version)
+        df = filter_bbox(df, dataset_index("water_quality"), min_lat, max_lat, min_lng, max_lng)
+
+        return csv_to_geojson(df, props=WATER_PROPS)
+
+    try:
+        return cached_response(request, ["water_quality"], build)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Data processing error: {str(e)}")
+
+@router.get("/registry")
+def get_registry_stats():
+    """
+    Load/hit counters for the shared in-memory dataset registry.
+    """
+    return registry.stats()
+
+@router.get("/response-cache")
+def get_response_cache_stats():
+    """
+    Size and hit/304 counters for the cached map-layer and summary responses.
+    """
+    return response_cache.stats()
+
+@router.get("/upstreams")
+def get_upstream_stats():
+    """
+    Calls, retries, failures, fail-fast rejections, latency and circuit state per upstream API.
+    """
+    return http.stats()
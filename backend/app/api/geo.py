@@ -1,27 +1,37 @@
 from fastapi import APIRouter, HTTPException, Query
 from app.services.osm import search_location, fetch_osm_features
+from app.services.responses import FastJSONResponse
+from app.services.places import place_store
 
 router = APIRouter()
 
 # 1. Search API (Nominatim Proxy)
 @router.get("/search")
-def search_places(q: str = Query(..., min_length=2)):
+async def search_places(q: str = Query(..., min_length=2)):
     """
     Search for a location using OSM Nominatim.
     Proxies request to avoid CORS on frontend.
     """
-    return search_location(q)
+    return await search_location(q)
 
 # 2. Places API (Map Features)
+@router.get("/places/store")
+def get_place_store_stats():
+    """
+    Places and tiles held in the local place store (used by probe's nearby counts).
+    """
+    return place_store.stats()
+
+
 @router.get("/places")
-def get_places(
+async def get_places(
     type: str = "hospital",
     min_lat: float = None, max_lat: float = None,
     min_lng: float = None, max_lng: float = None
 ):
     """
     Get places from OSM Overpass API.
-    Supports viewport filtering via BBox query params.
+    Supports viewport filtering via BBox query params (served from the per-tile cache).
     """
     if type not in ["hospital", "police", "fire_station", "park"]:
         raise HTTPException(status_code=400, detail="Invalid place type")
@@ -31,5 +41,6 @@ def get_places(
         bbox = (min_lat, min_lng, max_lat, max_lng)
         
     # Default to New Delhi if no bbox provided, or pass bbox
-    return fetch_osm_features(city_name="New Delhi", feature_type=type, bbox=bbox)
+    # Plain dicts/lists: serialize directly, skipping jsonable_encoder
+    return FastJSONResponse(await fetch_osm_features(city_name="New Delhi", feature_type=type, bbox=bbox))
 
@@ -1,14 +1,29 @@
-from fastapi import APIRouter, Query
-import random
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from typing import List
+import asyncio
 import math
-import datetime
+import numpy as np
 from app.api.data import csv_to_geojson # Reuse utils if needed
-from app.services.osm import fetch_osm_features
-import pandas as pd
-import os
+from app.services.datasets import registry
+from app.services.geocode import reverse_cache, reverse_geocode
+from app.services.spatial import NearestIndex
+from app.services.rollups import trends as rollup_trends, trends_many, snapshot as rollup_snapshot
+from app.services.responses import dumps
+from app.services.probe_cache import probe_cache
+from app.services.places import RADIUS_KM as PLACES_RADIUS_KM, place_store
+from app.services.osm import prefetch_places
+from app.api.auth import require_admin
+from app.api.traffic import CONGESTION_SCORES, _latest_snapshot
 
 router = APIRouter()
 
+MAX_BATCH_POINTS = 2000
+# Points scored per worker-thread hop; each chunk is streamed as soon as it's done
+BATCH_CHUNK = 64
+
 # --- Helpers ---
 def haversine(lat1, lon1, lat2, lon2):
     R = 6371  # Earth radius in km
@@ -21,178 +36,222 @@ def haversine(lat1, lon1, lat2, lon2):
     return R * c
 
 def generate_static_score(lat, lng, seed_offset=0):
-    """Generates a consistent score (0-100) based on location."""
+    """Generates a consistent score (0-100) based on location. Works on scalars or NumPy arrays."""
     # Simple hash based on coordinates to keep it deterministic for the same spot
     val = (lat * 1000 + lng * 1000 + seed_offset) % 100
     return abs(val)
 
+def _traffic_nearest(df):
+    """Latest traffic snapshot plus a nearest-neighbour index over its intersections."""
+    latest_df = _latest_snapshot(df)
+    return latest_df, NearestIndex.from_frame(latest_df)
+
+def _traffic_snapshot():
+    """(latest frame, nearest index) for the current traffic version, or None."""
+    if not registry.exists("traffic"):
+        return None
+    return registry.derive("traffic", "latest_nearest", _traffic_nearest)
+
+def _nearest_traffic_many(lats, lngs, snapshot):
+    """Nearest intersection in the latest snapshot for each coordinate (one BallTree query)."""
+    results = [{"congestion": 0, "speed": 0, "status": "Unknown"} for _ in range(len(lats))]
+    try:
+        if snapshot is not None:
+            latest_df, nearest = snapshot
+            positions, distances = nearest.nearest(lats, lngs)
+            if positions.size:
+                rows = latest_df.iloc[positions[:, 0]]
+                cong_scores = rows["Avg_Congestion_Level"].map(CONGESTION_SCORES).fillna(0.0).tolist()
+                speeds = rows["Average_Speed_kmh"].fillna(0).astype(float).tolist()
+                results = [
+                    {
+                        "congestion": cong_score,
+                        "speed": speed,
+                        "status": "High Traffic" if cong_score > 40 else "Moderate",
+                        "intersection_id": location_id,
+                        "distance_km": round(distance, 2),
+                        "timestamp": date
+                    }
+                    for cong_score, speed, location_id, date, distance in zip(
+                        cong_scores, speeds, rows["Location_ID"].tolist(), rows["Date"].tolist(),
+                        distances[:, 0].tolist())
+                ]
+    except Exception as e:
+        print(f"Traffic lookup error: {e}")
+    return results
+
+def _nearest_traffic(lat, lng):
+    """Nearest intersection in the latest snapshot (index built once per dataset version)."""
+    return _nearest_traffic_many([lat], [lng], _traffic_snapshot())[0]
+
+def _jitter(lats, lngs, low, high, seed_offset):
+    """
+    Stand-in for random.randint(low, high) that is fixed per location,
+    so a cached report is the same one a fresh computation would give.
+    """
+    return low + np.floor(generate_static_score(lats, lngs, seed_offset)).astype(int) % (high - low + 1)
+
+def _scores(lats, lngs):
+    """
+    Simulated per-location metrics for a batch of coordinates, as NumPy arrays.
+    generate_static_score is plain arithmetic, so it runs over the whole batch at once.
+    """
+    lats = np.asarray(lats, dtype="float64")
+    lngs = np.asarray(lngs, dtype="float64")
+    # Crime Rate (Inverse to Safety?)
+    crime_index = generate_static_score(lats, lngs, seed_offset=123)
+    return {
+        "crime_index": crime_index,
+        "safety_score": 100 - crime_index + _jitter(lats, lngs, -5, 5, seed_offset=7), # slight jitter
+        # Air Quality (Simulated per region)
+        "aqi": generate_static_score(lats, lngs, seed_offset=55) * 2 + 50, # Range 50-250
+        # Water Quality
+        "wqi": generate_static_score(lats, lngs, seed_offset=99),
+        "noise_jitter": _jitter(lats, lngs, 30, 50, seed_offset=11),
+        # Downtown/Westside AQI offsets
+        "regional_var": np.column_stack([generate_static_score(lats, lngs, seed_offset=300 + idx) % 40 - 20
+                                         for idx in range(2)]),
+    }
+
+def _located(report, lat, lng):
+    """A report computed for a quantized cell, labelled with the caller's exact point and street."""
+    return {**report, "location": {"lat": lat, "lng": lng, "address": reverse_geocode(lat, lng)}}
+
+def _row(scores, i):
+    """One location's values from _scores(), as Python scalars."""
+    return {key: values[i].tolist() for key, values in scores.items()}
+
 # --- Endpoints ---
 
+@router.get("/geocode-cache")
+def get_geocode_cache_stats():
+    """
+    Hit/miss counters for the reverse geocode cache.
+    """
+    return reverse_cache.stats()
+
+@router.get("/cache")
+def get_probe_cache_stats():
+    """
+    Hit/miss counters for the cached /analyze reports.
+    """
+    return probe_cache.stats()
+
+@router.delete("/cache")
+def invalidate_probe_cache(_admin=Depends(require_admin)):
+    """
+    Drops every cached /analyze report (admin only), e.g. after changing scoring inputs
+    that aren't covered by the dataset versions in the key.
+    """
+    return {"dropped": probe_cache.invalidate()}
+
 @router.get("/analyze")
-def analyze_location(lat: float, lng: float, days: int = 7):
+async def analyze_location(lat: float, lng: float, days: int = 7):
     """
     Returns comprehensive intelligence for a specific point.
     Aggregates Traffic, Environment, Safety, and Civic Data.
-    days: Number of days for trend analysis (1 = 24 hours, others = N days)
+    days: Number of days for trend analysis (1 = latest daily reading, others = N days)
+    Reports are computed per quantized cell and cached (see probe_cache).
     """
-    
-    # 1. Traffic Data (Real - from CSV)
-    # We load the CSV and find the nearest point
-    traffic_data = {"congestion": 0, "speed": 0, "status": "Unknown"}
-    congestion = 0
-    try:
-        base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        traffic_file = os.path.join(base_dir, "data", "smart_city_traffic_2025_2026.csv")
-        
-        if os.path.exists(traffic_file):
-            df = pd.read_csv(traffic_file)
-            # Offset Logic (Same as traffic.py to match visual)
-            # Simplified for Demo Speed: Hash-pick a row to "simulate" reading
-            row_idx = int((lat * 100 + lng * 100) % len(df))
-            row = df.iloc[row_idx]
-            
-            # Map congestion string to a float score
-            cong_map = {'Low': 20.0, 'Moderate': 50.0, 'High': 75.0, 'Severe': 95.0}
-            cong_level = row.get("Avg_Congestion_Level", "Low")
-            cong_score = cong_map.get(cong_level, 0.0)
-
-            traffic_data = {
-                "congestion": cong_score,
-                "speed": float(row.get("Average_Speed_kmh", 0)),
-                "status": "High Traffic" if cong_score > 40 else "Moderate"
-            }
-            congestion = cong_score
-    except Exception as e:
-        print(f"Traffic lookup error: {e}")
+    cell_lat, cell_lng = probe_cache.quantize(lat, lng)
+    # Places around the cell not stored yet (or stale) are fetched in the background;
+    # their tiles' fetch time is part of the cache key, so the report updates once they land
+    prefetch_places(cell_lat, cell_lng, PLACES_RADIUS_KM)
 
-    # 2. Simulated/calculated Metrics
-    # Crime Rate (Inverse to Safety?)
-    crime_index = generate_static_score(lat, lng, seed_offset=123)
-    safety_score = 100 - crime_index + (random.randint(-5, 5)) # slight jitter
-    
-    # Air Quality (Simulated per region)
-    aqi = generate_static_score(lat, lng, seed_offset=55) * 2 + 50 # Range 50-250
-    
-    # Water Quality
-    wqi = generate_static_score(lat, lng, seed_offset=99)
-    
-    # 3. Nearby Amenities (Mocked or Real)
-    # Let's mock counts based on "Safety Score" (Safer areas have more amenities usually)
-    hospitals = int(safety_score / 20)
-    parks = int(safety_score / 15)
-    malls = int(crime_index / 30)
+    key = probe_cache.key(lat, lng, days)
+    report = probe_cache.get(key)
+    if report is None:
+        # 1. Traffic Data (Real - from CSV), Historical Trends (precomputed rollups) and Nearby Places
+        # All pandas/numpy/BallTree work: run them in worker threads, concurrently, off the event loop
+        traffic_data, trends, places = await asyncio.gather(
+            run_in_threadpool(_nearest_traffic, cell_lat, cell_lng),
+            run_in_threadpool(rollup_trends, cell_lat, cell_lng, days),
+            run_in_threadpool(place_store.nearby_many, [cell_lat], [cell_lng]),
+        )
+        scores = _row(_scores([cell_lat], [cell_lng]), 0)
+        report = _site_report(cell_lat, cell_lng, None, traffic_data, trends, places[0], scores)
+        probe_cache.set(key, report)
+
+    # 2. Reverse Geocoding (Get Street Name)
+    # Served from the quantized cache; a miss returns the coordinates and fills in the background.
+    # A memory miss reads the SQLite tier (and can wait on a fill's commit), so not on the event loop
+    return await run_in_threadpool(_located, report, lat, lng)
+
+def _analyze_many(lats, lngs, days, snapshot):
+    """Site reports for a chunk of coordinates, every lookup vectorized across the chunk."""
+    traffic_snapshot, rollups, place_state = snapshot
+    # Same quantized cells as /analyze, so both endpoints agree point for point
+    cells = [probe_cache.quantize(lat, lng) for lat, lng in zip(lats.tolist(), lngs.tolist())]
+    cell_lats, cell_lngs = np.array(cells).reshape(-1, 2).T
+    traffic = _nearest_traffic_many(cell_lats, cell_lngs, traffic_snapshot)
+    trends = trends_many(cell_lats, cell_lngs, days, rollups=rollups)
+    places = place_store.nearby_many(cell_lats, cell_lngs, state=place_state)
+    scores = _scores(cell_lats, cell_lngs)
+    return [
+        _located(_site_report(cell_lat, cell_lng, None, traffic[i], trends[i], places[i], _row(scores, i)), lat, lng)
+        for i, (lat, lng, cell_lat, cell_lng) in enumerate(zip(
+            lats.tolist(), lngs.tolist(), cell_lats.tolist(), cell_lngs.tolist()))
+    ]
+
+class ProbePoint(BaseModel):
+    lat: float = Field(ge=-90, le=90)
+    lng: float = Field(ge=-180, le=180)
+
+class BatchProbeRequest(BaseModel):
+    points: List[ProbePoint]
+    days: int = 7
+
+@router.post("/analyze-batch")
+async def analyze_batch(req: BatchProbeRequest):
+    """
+    /analyze for many coordinates in one request (up to MAX_BATCH_POINTS).
+    All points read the same dataset snapshot (places: whatever is stored, nothing is fetched). Results stream back as NDJSON, one line per
+    location ({"index": i, ...report}), as each chunk of BATCH_CHUNK points finishes.
+    """
+    if not req.points:
+        raise HTTPException(status_code=400, detail="No points given")
+    if len(req.points) > MAX_BATCH_POINTS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_POINTS} points per batch")
+
+    lats = np.array([p.lat for p in req.points])
+    lngs = np.array([p.lng for p in req.points])
+    snapshot = await run_in_threadpool(lambda: (_traffic_snapshot(), rollup_snapshot(), place_store.state()))
+
+    async def stream():
+        for start in range(0, len(lats), BATCH_CHUNK):
+            stop = start + BATCH_CHUNK
+            reports = await run_in_threadpool(_analyze_many, lats[start:stop], lngs[start:stop], req.days, snapshot)
+            yield b"".join(dumps({"index": start + i, **report}) + b"\n" for i, report in enumerate(reports))
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson",
+                             headers={"X-Batch-Size": str(len(lats))})
+
+def _site_report(lat, lng, address, traffic_data, trends, places, scores):
+    """
+    Assembles the /analyze response for one location from its traffic, trends,
+    address, nearby places (place_store.nearby_many) and simulated scores (one row of _scores()).
+    """
+    crime_index = scores["crime_index"]
+    safety_score = scores["safety_score"]
+    aqi = scores["aqi"]
+    wqi = scores["wqi"]
+    congestion = traffic_data["congestion"]
+
+    # 3. Nearby Amenities: real counts within PLACES_RADIUS_KM once the area's OSM places are stored,
+    # until then mocked from "Safety Score" (Safer areas have more amenities usually)
+    hospitals = places["hospital"]["count"] if places["hospital"] else int(safety_score / 20)
+    parks = places["park"]["count"] if places["park"] else int(safety_score / 15)
+    malls = int(crime_index / 30) # no shop data: still mocked
 
     weather_types = ["Sunny", "Cloudy", "Rainy", "Haze"]
     weather = weather_types[int(crime_index) % 4]
 
     # Noise Level (Simulated based on traffic)
-    noise_level = int(traffic_data["congestion"] * 0.8 + random.randint(30, 50))
+    noise_level = int(traffic_data["congestion"] * 0.8 + scores["noise_jitter"])
     noise_idx = min(100, noise_level)
     
-    # 4. Reverse Geocoding (Get Street Name)
-    address = "Unknown Location"
-    try:
-        import requests
-        headers = {'User-Agent': 'SmartCityProbe/1.0'}
-        url = f"https://nominatim.openstreetmap.org/reverse?lat={lat}&lon={lng}&format=json"
-        
-        # Real-time fetch (Timeout 1.5s to stay snappy)
-        r = requests.get(url, headers=headers, timeout=1.5)
-        if r.status_code == 200:
-            addr_data = r.json()
-            address = addr_data.get('display_name', 'Unknown Area')
-            # simplify address
-            address = ", ".join(address.split(",")[:3])
-    except:
-        address = f"Coord: {lat:.4f}, {lng:.4f}"
-
-    # 6. Historical Trend Generation (Simulated Data)
-    heatmap_aqi = []
-    heatmap_traffic = []
-    heatmap_humidity = []
-    heatmap_water = []
-    heatmap_crime = []
-    
-    labels = []
-    
-    is_hourly = (days == 1)
-    num_points = 24 if is_hourly else days
-    
-    # Base Values
+    # 6. Historical Trends: passed in (precomputed rollups)
     base_aqi = int(aqi)
-    base_traffic = int(traffic_data.get("congestion", 0))
-    base_crime_rate = crime_index 
-    base_wqi = int(wqi)
-    
-    # Generate Time Labels
-    if is_hourly:
-        # Generate 00:00 to 23:00
-        for h in range(24):
-            labels.append(f"{h:02d}:00")
-    else:
-        # Generate last N days
-        weekdays = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-        today = datetime.datetime.now()
-        for d in range(num_points):
-            date = today - datetime.timedelta(days=num_points-1-d)
-            if num_points <= 7:
-                 labels.append(weekdays[date.weekday()])
-            elif num_points <= 30:
-                 labels.append(date.strftime("%d %b"))
-            else:
-                 labels.append(date.strftime("%b")) 
-                 
-    if days == 365:
-        labels = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
-        num_points = 12
-
-    for i in range(num_points):
-        # Seed Variance
-        seed = int(lat * 1000 + lng * 1000 + i)
-        
-        # Day Factor
-        factor = 1.0
-        if not is_hourly and days < 30 and (i % 7) > 4: 
-             factor = 0.8
-        
-        if is_hourly:
-            if 8 <= i <= 10 or 17 <= i <= 19:
-                factor = 1.4
-            elif 0 <= i <= 5:
-                factor = 0.2
-        
-        noise = (seed % 20) - 10
-        
-        sim_aqi = max(20, min(300, int(base_aqi * factor + noise)))
-        sim_traffic = max(0, min(100, int(base_traffic * factor + noise)))
-        
-        h_noise = (seed % 10) - 5
-        sim_humidity = max(40, min(95, 60 + h_noise + (10 if not is_hourly else 0)))
-        
-        sim_water = max(0, min(100, base_wqi + ((seed%5)-2)))
-        
-        c_factor = 1.0
-        if is_hourly:
-            if 22 <= i or i <= 4: c_factor = 1.5 
-        else:
-            if (i % 7) > 4: c_factor = 1.2 
-            
-        sim_crime = max(0, min(10, (base_crime_rate/10.0) * c_factor))
-        
-        heatmap_aqi.append(sim_aqi)
-        heatmap_traffic.append(sim_traffic)
-        heatmap_humidity.append(int(sim_humidity))
-        heatmap_water.append(int(sim_water))
-        heatmap_crime.append(round(sim_crime, 1))
-
-    trends = {
-        "days": labels,
-        "aqi": heatmap_aqi,
-        "traffic": heatmap_traffic,
-        "humidity": heatmap_humidity,
-        "water": heatmap_water,
-        "crime": heatmap_crime
-    }
 
     # 7. Regional Comparison
     regional = []
@@ -206,7 +265,7 @@ def analyze_location(lat: float, lng: float, days: int = 7):
             r_aqi = max(20, base_aqi - 30)
             r_safe = min(100, safety_score + 10)
         else:
-            var_aqi = generate_static_score(lat, lng, seed_offset=300+idx) % 40 - 20
+            var_aqi = scores["regional_var"][idx]
             r_aqi = max(20, base_aqi + var_aqi)
             r_safe = safety_score 
             
@@ -277,9 +336,14 @@ def analyze_location(lat: float, lng: float, days: int = 7):
             "reviews": int(safety_score * 12)
         },
         "nearby": {
-            "hospitals": hospitals + 1,
-            "parks": parks + 1,
+            "hospitals": hospitals,
+            "parks": parks,
             "malls": malls,
+            "police": places["police"]["count"] if places["police"] else None,
+            "fire_stations": places["fire_station"]["count"] if places["fire_station"] else None,
+            "nearest_km": {t: place["nearest_km"] if place else None for t, place in places.items()},
+            "radius_km": PLACES_RADIUS_KM,
+            "source": "osm" if places["hospital"] and places["park"] else "estimated",
             "parking_score": int(100 - congestion),
             "transport_score": int(traffic_data["speed"] + 40)
         },
@@ -1,16 +1,39 @@
 
-import os
-import pandas as pd
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from typing import Optional
+from app.services.datasets import registry
+from app.services.geojson import Const, FeatureLayer
+from app.services.response_cache import cached_response
 
 router = APIRouter()
 
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data")
-CSV_FILE = os.path.join(DATA_DIR, "smart_city_traffic_2025_2026.csv")
+# Map congestion string to a float score
+CONGESTION_SCORES = {'Low': 20.0, 'Moderate': 50.0, 'High': 75.0, 'Severe': 95.0}
+
+# GeoJSON property -> snapshot column
+TRAFFIC_PROPERTIES = {
+    "intersection_id": "Location_ID",
+    "congestion": "congestion",
+    "flow_vpm": "Daily_Vehicle_Count",
+    "avg_speed": "Average_Speed_kmh",
+    "incidents": Const(0),
+    "timestamp": "Date",
+}
+
+def _latest_snapshot(df):
+    """Rows of the most recent Date, with the congestion score precomputed."""
+    # ISO dates compare correctly as strings
+    latest_df = df[df['Date'] == df['Date'].max()].reset_index(drop=True)
+    latest_df["congestion"] = latest_df["Avg_Congestion_Level"].map(CONGESTION_SCORES).fillna(0.0)
+    return latest_df
+
+def _latest_layer(df):
+    """Materialized latest-snapshot layer (pre-encoded features + grid index), once per dataset version."""
+    return FeatureLayer(_latest_snapshot(df), TRAFFIC_PROPERTIES)
 
 @router.get("/")
 def get_traffic_flow(
+    request: Request,
     min_lat: float = None, max_lat: float = None,
     min_lng: float = None, max_lng: float = None
 ):
@@ -18,55 +41,18 @@ def get_traffic_flow(
     Returns the latest traffic flow data as GeoJSON.
     Filters by Date to get the most recent snapshot.
     """
-    if not os.path.exists(CSV_FILE):
+    if not registry.exists("traffic"):
         return {"type": "FeatureCollection", "features": []}
 
     try:
-        # Load data
-        df = pd.read_csv(CSV_FILE)
-        
-        # Ensure timestamp is datetime
-        df['Date'] = pd.to_datetime(df['Date'])
-        
-        # Get latest timestamp
-        latest_time = df['Date'].max()
-        
-        # Filter for latest data snapshot
-        latest_df = df[df['Date'] == latest_time]
-        
-        features = []
-        cong_map = {'Low': 20.0, 'Moderate': 50.0, 'High': 75.0, 'Severe': 95.0}
+        def build():
+            # Latest data snapshot, materialized once per dataset version
+            layer = registry.derive("traffic", "latest_layer", _latest_layer)
 
-        for _, row in latest_df.iterrows():
-            lat = row.get("Latitude")
-            lng = row.get("Longitude")
-            
-            # Filter by BBox
-            if min_lat is not None:
-                if not (min_lat <= lat <= max_lat and min_lng <= lng <= max_lng):
-                    continue
+            # Filter by BBox and join the pre-encoded features
+            return layer.body(min_lat, max_lat, min_lng, max_lng)
 
-            feature = {
-                "type": "Feature",
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [lng, lat]
-                },
-                "properties": {
-                    "intersection_id": row.get("Location_ID"),
-                    "congestion": cong_map.get(row.get("Avg_Congestion_Level", "Low"), 0),
-                    "flow_vpm": row.get("Daily_Vehicle_Count"),
-                    "avg_speed": row.get("Average_Speed_kmh"),
-                    "incidents": 0,
-                    "timestamp": str(row.get("Date").date())
-                }
-            }
-            features.append(feature)
-
-        return {
-            "type": "FeatureCollection",
-            "features": features
-        }
+        return cached_response(request, ["traffic"], build)
 
     except Exception as e:
         print(f"Error serving traffic data: {e}")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, TypeDecorator
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, TypeDecorator, UniqueConstraint
 from sqlalchemy.sql import func
 from geoalchemy2 import Geometry
 from app.db.session import Base
@@ -24,13 +24,24 @@ class User(Base):
 
 class Place(Base):
     __tablename__ = "places"
+    # One row per OSM element and type (the upsert key); spatial index: app/db/spatial.py
+    __table_args__ = (UniqueConstraint("type", "osm_id", name="uq_places_type_osm_id"),)
     id = Column(Integer, primary_key=True, index=True)
+    osm_id = Column(String, index=True) # e.g. "node/123"
     name = Column(String, index=True)
-    type = Column(String) # hospital, police, etc.
+    type = Column(String, index=True) # hospital, police, etc.
     latitude = Column(Float)
     longitude = Column(Float)
     details = Column(String, nullable=True) # JSON stored as string for simplicity
 
+class PlaceTile(Base):
+    """An OSM tile whose places of one type are stored in `places`, and when it was fetched."""
+    __tablename__ = "place_tiles"
+    type = Column(String, primary_key=True)
+    row = Column(Integer, primary_key=True)
+    col = Column(Integer, primary_key=True)
+    fetched_at = Column(Float) # unix time
+
 class AirQuality(Base):
     __tablename__ = "air_quality"
     id = Column(Integer, primary_key=True, index=True)
@@ -0,0 +1,113 @@
+import logging
+from sqlalchemy import inspect, text
+
+logger = logging.getLogger("uvicorn")
+
+# SQLite: an R*Tree virtual table over places, kept in sync by triggers.
+# R*Tree stores float32 boxes rounded outwards, so queries re-check the exact coordinates.
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS places_rtree USING rtree(id, min_lat, max_lat, min_lng, max_lng)",
+    """CREATE TRIGGER IF NOT EXISTS places_rtree_insert AFTER INSERT ON places
+       WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN
+         INSERT OR REPLACE INTO places_rtree VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS places_rtree_update AFTER UPDATE OF latitude, longitude ON places BEGIN
+         DELETE FROM places_rtree WHERE id = old.id;
+         INSERT INTO places_rtree SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude
+         WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS places_rtree_delete AFTER DELETE ON places BEGIN
+         DELETE FROM places_rtree WHERE id = old.id;
+       END""",
+    # Rows written before the index existed
+    """INSERT OR REPLACE INTO places_rtree
+       SELECT id, latitude, latitude, longitude, longitude FROM places
+       WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND id NOT IN (SELECT id FROM places_rtree)""",
+]
+
+# PostGIS: a GiST expression index on the point, no extra column to keep in sync
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS postgis",
+    "CREATE INDEX IF NOT EXISTS ix_places_geom ON places "
+    "USING GIST (ST_SetSRID(ST_MakePoint(longitude, latitude), 4326))",
+]
+
+_BBOX_SQL = {
+    "sqlite": """
+        SELECT p.id, p.osm_id, p.name, p.latitude, p.longitude, p.details
+        FROM places_rtree r JOIN places p ON p.id = r.id
+        WHERE r.min_lat <= :max_lat AND r.max_lat >= :min_lat
+          AND r.min_lng <= :max_lng AND r.max_lng >= :min_lng
+          AND p.type = :type
+          AND p.latitude BETWEEN :min_lat AND :max_lat AND p.longitude BETWEEN :min_lng AND :max_lng""",
+    "postgresql": """
+        SELECT p.id, p.osm_id, p.name, p.latitude, p.longitude, p.details
+        FROM places p
+        WHERE ST_SetSRID(ST_MakePoint(p.longitude, p.latitude), 4326)
+              && ST_MakeEnvelope(:min_lng, :min_lat, :max_lng, :max_lat, 4326)
+          AND p.type = :type""",
+}
+# No spatial index available: plain range scan
+_FALLBACK_SQL = """
+    SELECT p.id, p.osm_id, p.name, p.latitude, p.longitude, p.details
+    FROM places p
+    WHERE p.type = :type
+      AND p.latitude BETWEEN :min_lat AND :max_lat AND p.longitude BETWEEN :min_lng AND :max_lng"""
+
+_indexed = set()   # dialect names whose spatial index was created
+
+
+def migrate_places(engine):
+    """
+    Brings a `places` table created by an older schema up to the current one (before create_place_index):
+    adds the osm_id column if missing and replaces a unique index on osm_id alone with the
+    (type, osm_id) one the ingest upsert conflicts on. A no-op on an up-to-date table.
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table("places"):
+        return
+    columns = {c["name"] for c in inspector.get_columns("places")}
+    indexes = inspector.get_indexes("places")
+    unique_keys = [sorted(u["column_names"]) for u in inspector.get_unique_constraints("places")]
+    unique_keys += [sorted(i["column_names"]) for i in indexes if i["unique"]]
+    try:
+        with engine.begin() as conn:
+            if "osm_id" not in columns:
+                conn.execute(text("ALTER TABLE places ADD COLUMN osm_id VARCHAR"))
+            for index in indexes:
+                if index["unique"] and index["column_names"] == ["osm_id"]:
+                    conn.execute(text(f'DROP INDEX "{index["name"]}"'))
+                    logger.info(f"places: dropped unique index {index['name']} on osm_id")
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_places_osm_id ON places (osm_id)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_places_type ON places (type)"))
+            if ["osm_id", "type"] not in unique_keys:
+                conn.execute(text("CREATE UNIQUE INDEX uq_places_type_osm_id ON places (type, osm_id)"))
+    except Exception as e:
+        logger.error(f"places schema migration failed: {e}")
+
+
+def create_place_index(engine):
+    """Creates the spatial index on places for this database (after create_all)."""
+    dialect = engine.dialect.name
+    statements = {"sqlite": SQLITE_DDL, "postgresql": POSTGRES_DDL}.get(dialect)
+    if statements is None:
+        return
+    try:
+        with engine.begin() as conn:
+            for statement in statements:
+                conn.execute(text(statement))
+        _indexed.add(dialect)
+    except Exception as e:
+        # e.g. PostGIS not installed: bbox queries fall back to a range scan
+        logger.error(f"Spatial index on places not created: {e}")
+
+
+def places_in_bbox(db, feature_type, bbox):
+    """
+    Rows (id, osm_id, name, latitude, longitude, details) of one type inside
+    bbox = (min_lat, min_lng, max_lat, max_lng), answered from the spatial index.
+    """
+    dialect = db.get_bind().dialect.name
+    sql = _BBOX_SQL[dialect] if dialect in _indexed else _FALLBACK_SQL
+    params = {"type": feature_type, "min_lat": bbox[0], "min_lng": bbox[1], "max_lat": bbox[2], "max_lng": bbox[3]}
+    return db.execute(text(sql), params).all()
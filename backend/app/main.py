@@ -3,8 +3,14 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.api import geo, auth, data, analytics
 from app.db.session import engine, Base
 from app.db import models # Import models to register them
+from app.db.spatial import create_place_index, migrate_places
+from app.services.model_registry import model_registry
+from app.services.responses import FastJSONResponse
+from app.services.compression import CompressionMiddleware
+from app.services import http
+from app.services.places import place_store
 
-app = FastAPI(title="Smart City API", version="1.0.3") # Bump again
+app = FastAPI(title="Smart City API", version="1.0.3", default_response_class=FastJSONResponse) # Bump again
 
 # CORS
 origins = ["*"]
@@ -17,11 +23,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/brotli per Accept-Encoding for large JSON bodies
+app.add_middleware(CompressionMiddleware)
+
 # Startup Event: Create Tables
 @app.on_event("startup")
 def on_startup():
     # Create tables if they don't exist
     models.Base.metadata.create_all(bind=engine)
+    # create_all leaves existing tables alone: upgrade a places table from an older schema
+    migrate_places(engine)
+    # R*Tree (SQLite) / GiST (PostGIS) index for bbox queries on places
+    create_place_index(engine)
+    # Warm the climate model so the first prediction doesn't pay for unpickling
+    try:
+        model_registry.load()
+    except Exception as e:
+        print(f"Climate model not loaded at startup: {e}")
+    # Load the stored OSM places and build their BallTrees before the first probe
+    place_store.state()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await http.aclose()
 
 @app.get("/")
 def read_root():
@@ -32,6 +56,8 @@ app.include_router(auth.router, prefix="/api/auth", tags=["Auth"])
 app.include_router(geo.router, prefix="/api/geocode", tags=["Geo"])
 app.include_router(data.router, prefix="/api/data", tags=["Data"])
 app.include_router(analytics.router, prefix="/api/analytics", tags=["Analytics"])
-from app.api import traffic, probe
+from app.api import traffic, probe, aqi_india, chennai
 app.include_router(traffic.router, prefix="/api/data/traffic", tags=["Traffic"])
+app.include_router(aqi_india.router, prefix="/api/data/aqi-india", tags=["AQI India"])
+app.include_router(chennai.router, prefix="/api/data/chennai", tags=["Chennai"])
 app.include_router(probe.router, prefix="/api/probe", tags=["Probe"])
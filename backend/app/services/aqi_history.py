@@ -0,0 +1,202 @@
+import os
+import glob
+import json
+import base64
+import threading
+import logging
+import numpy as np
+import pandas as pd
+from app.services.columnar import read_table, AQI_INDIA_SOURCE
+from app.services.spatial import GridIndex
+
+logger = logging.getLogger("uvicorn")
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PROJECT_DIR = os.path.dirname(BASE_DIR)
+HISTORY_DIR = os.path.join(PROJECT_DIR, "data", "aqi_india")
+STATIONS_FILE = os.path.join(PROJECT_DIR, "data", "station_coordinates.json")
+
+POLLUTANTS = ["PM2.5", "PM10", "NO2", "NH3", "SO2", "CO", "O3"]
+DATE_COL, DATE_FORMAT = AQI_INDIA_SOURCE
+DTYPE = {DATE_COL: "str", "Location": "str", **{p: "float64" for p in POLLUTANTS}}
+
+
+def encode_cursor(station, day):
+    raw = json.dumps([station, str(day)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(station name, 'YYYY-MM-DD') of the last row served. Raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        station, day = json.loads(raw)
+        return str(station), np.datetime64(day, "D")
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+class HistoryStore:
+    """
+    Daily pollutant readings for the aqi_india stations, one dense float32 matrix per pollutant
+    (station x day, NaN where nothing was reported). A row is addressed by (station position,
+    days since `start`), so station, date-range and bbox filters are slices rather than scans.
+    Stations are ordered by name and carry the coordinates from station_coordinates.json.
+    """
+
+    def __init__(self, frames, coordinates):
+        # 1. One long frame: station, day, pollutants
+        df = pd.concat(frames, ignore_index=True)
+        day = pd.to_datetime(df[DATE_COL], format=DATE_FORMAT, errors="coerce")
+        keep = (day.notna() & df["Location"].notna()).to_numpy()
+        df = df[keep]
+        days = day[keep].to_numpy().astype("datetime64[D]")
+
+        # 2. Station table, joined with the geocoded coordinates
+        stations = df.groupby("Location")["City"].first().sort_index()
+        self.names = list(stations.index)
+        self.cities = list(stations.values)
+        self.positions = {name: i for i, name in enumerate(self.names)}
+        self.lats = np.full(len(self.names), np.nan)
+        self.lngs = np.full(len(self.names), np.nan)
+        for i, (name, city) in enumerate(zip(self.names, self.cities)):
+            coords = coordinates.get(f"{name}, {city}, India")
+            if coords:
+                self.lats[i], self.lngs[i] = coords["lat"], coords["lng"]
+        self.index = GridIndex(self.lats, self.lngs)
+
+        # 3. Dense station x day matrices
+        self.start = days.min() if len(days) else np.datetime64("1970-01-01", "D")
+        self.n_days = int((days.max() - self.start).astype(int)) + 1 if len(days) else 0
+        rows = df["Location"].map(self.positions).to_numpy()
+        cols = (days - self.start).astype("int64")
+        self.series = {}
+        for pollutant in POLLUTANTS:
+            matrix = np.full((len(self.names), self.n_days), np.nan, dtype="float32")
+            matrix[rows, cols] = df[pollutant].to_numpy(dtype="float32", na_value=np.nan)
+            self.series[pollutant] = matrix
+        self.size = len(df)
+
+    def stations(self):
+        return [
+            {"station": name, "city": city,
+             "lat": None if np.isnan(lat) else float(lat), "lng": None if np.isnan(lng) else float(lng)}
+            for name, city, lat, lng in zip(self.names, self.cities, self.lats, self.lngs)
+        ]
+
+    def _day(self, value, default):
+        if value is None:
+            return default
+        return int(np.clip((np.datetime64(value, "D") - self.start).astype(int), -1, self.n_days))
+
+    def query(self, pollutants=None, station=None, bbox=None, start=None, end=None, cursor=None, limit=500):
+        """
+        Readings ordered by (station, date), `limit` at a time.
+        Rows where none of the requested pollutants were reported are skipped.
+        Returns (records, next_cursor); next_cursor is None on the last page.
+        """
+        pollutants = pollutants or POLLUTANTS
+        matrices = [self.series[p] for p in pollutants]
+
+        # 1. Stations
+        selected = range(len(self.names))
+        if bbox is not None:
+            selected = self.index.query(*bbox).tolist()
+        if station is not None:
+            selected = [s for s in selected if self.names[s] == station]
+
+        # 2. Day window (inclusive)
+        d0 = max(self._day(start, 0), 0)
+        d1 = min(self._day(end, self.n_days - 1), self.n_days - 1)
+
+        # 3. Resume after the cursor row
+        after = None
+        if cursor is not None:
+            name, day = decode_cursor(cursor)
+            if name not in self.positions:
+                # e.g. the store was rebuilt without it; restarting silently could page forever
+                raise ValueError(f"Invalid cursor: unknown station {name!r}")
+            after = (self.positions[name], int((day - self.start).astype(int)))
+
+        records = []
+        for s in selected:
+            if after is not None and s < after[0]:
+                continue
+            lo = max(d0, after[1] + 1) if after is not None and s == after[0] else d0
+            if lo > d1:
+                continue
+            window = np.stack([m[s, lo:d1 + 1] for m in matrices])
+            reported = np.flatnonzero(~np.isnan(window).all(axis=0))
+            for offset in reported[:limit + 1 - len(records)]:
+                values = window[:, offset]
+                records.append({
+                    "station": self.names[s],
+                    "city": self.cities[s],
+                    "date": str(self.start + lo + int(offset)),
+                    **{p: None if np.isnan(v) else round(float(v), 2) for p, v in zip(pollutants, values)},
+                })
+            if len(records) > limit:
+                break
+
+        next_cursor = None
+        if len(records) > limit:
+            records = records[:limit]
+            next_cursor = encode_cursor(records[-1]["station"], records[-1]["date"])
+        return records, next_cursor
+
+
+class AqiHistory:
+    """
+    Loads the *_combined.csv files (through their columnar copies) into a HistoryStore,
+    rebuilt only when a file or the station coordinates change on disk.
+    """
+
+    def __init__(self, directory=HISTORY_DIR, stations_file=STATIONS_FILE):
+        self.directory = directory
+        self.stations_file = stations_file
+        self._lock = threading.Lock()
+        self._store = None
+        self._fingerprint = None
+        self.version = 0
+
+    def files(self):
+        return sorted(glob.glob(os.path.join(self.directory, "*_combined.csv")))
+
+    def _current_fingerprint(self, files):
+        paths = files + ([self.stations_file] if os.path.exists(self.stations_file) else [])
+        return tuple((p, os.stat(p).st_mtime_ns) for p in paths)
+
+    def exists(self):
+        return bool(self.files())
+
+    def store(self):
+        files = self.files()
+        if not files:
+            raise FileNotFoundError(f"No *_combined.csv files in {self.directory}")
+        fingerprint = self._current_fingerprint(files)
+        if self._store is not None and fingerprint == self._fingerprint:
+            return self._store
+
+        with self._lock:
+            if self._store is not None and fingerprint == self._fingerprint:
+                return self._store
+
+            frames = []
+            for path in files:
+                df = read_table(path, dtype=DTYPE)
+                df["City"] = os.path.basename(path).split("_")[0].title()
+                frames.append(df)
+            coordinates = {}
+            if os.path.exists(self.stations_file):
+                with open(self.stations_file) as f:
+                    coordinates = json.load(f)
+
+            self._store = HistoryStore(frames, coordinates)
+            self._fingerprint = fingerprint
+            self.version += 1
+            logger.info(f"AQI history loaded (v{self.version}, {self._store.size} rows, "
+                        f"{len(self._store.names)} stations)")
+            return self._store
+
+
+aqi_history = AqiHistory()
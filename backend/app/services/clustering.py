@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+from app.services.geojson import Const, FeatureLayer, encode_features
+
+# Zoom levels (web-map convention) that are served as clusters; above this, raw points
+MAX_CLUSTER_ZOOM = 12
+# Grid cells per 256px map tile edge (~64px per cluster cell on screen)
+CELLS_PER_TILE = 4
+
+
+def cell_size(zoom):
+    """Cluster cell edge in degrees at a zoom level."""
+    return 360.0 / (2 ** zoom) / CELLS_PER_TILE
+
+
+class ClusterIndex:
+    """
+    Hierarchical grid clustering of a point dataset, one level per zoom.
+    The finest level buckets points into cells of cell_size(max_zoom); every coarser level
+    merges 2x2 cells of the level below, so counts and sums roll up exactly.
+    Each level is materialized as a FeatureLayer of cluster centroids, so a request is a bbox
+    lookup plus a join of pre-encoded features, and the payload is bounded by the number of
+    cells on screen rather than the number of records.
+    A cell holding a single record is served as that record's plain point (point_properties).
+    """
+
+    def __init__(self, df, value_col, value_key, point_properties, lat_col="Latitude", lon_col="Longitude",
+                 max_zoom=MAX_CLUSTER_ZOOM):
+        self.max_zoom = max_zoom
+        self.value_key = value_key
+
+        lats = df[lat_col].to_numpy(dtype="float64", na_value=np.nan)
+        lngs = df[lon_col].to_numpy(dtype="float64", na_value=np.nan)
+        vals = df[value_col].to_numpy(dtype="float64", na_value=np.nan)
+        keep = np.isfinite(lats) & np.isfinite(lngs)
+        lats, lngs, vals = lats[keep], lngs[keep], vals[keep]
+        has_val = np.isfinite(vals)
+        points = np.array(encode_features(df[keep], point_properties, lat_col=lat_col, lon_col=lon_col),
+                          dtype=object)
+
+        finest = cell_size(max_zoom)
+        level = {
+            "ix": np.floor((lngs + 180.0) / finest).astype("int64"),
+            "iy": np.floor((lats + 90.0) / finest).astype("int64"),
+            "count": np.ones(len(lats)),
+            "sum_lat": lats,
+            "sum_lng": lngs,
+            "sum_val": np.where(has_val, vals, 0.0),
+            "n_val": has_val.astype("float64"),
+            "first": np.arange(len(lats)),
+        }
+
+        properties = {"cluster": Const(True), "point_count": "point_count", value_key: "mean"}
+        self.levels = {}
+        for zoom in range(max_zoom, -1, -1):
+            level = self._aggregate(level)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                frame = pd.DataFrame({
+                    "Latitude": level["sum_lat"] / level["count"],
+                    "Longitude": level["sum_lng"] / level["count"],
+                    "point_count": level["count"].astype("int64"),
+                    "mean": np.round(level["sum_val"] / level["n_val"], 1),
+                })
+            clusters = np.array(encode_features(frame, properties), dtype=object)
+            single = level["count"] == 1
+            clusters[single] = points[level["first"][single]]
+            self.levels[zoom] = FeatureLayer(frame, properties, features=clusters)
+            # Parent cells for the next (coarser) level
+            level = dict(level, ix=level["ix"] >> 1, iy=level["iy"] >> 1)
+
+    @staticmethod
+    def _aggregate(level):
+        """Merges entries that share a cell, summing the accumulators."""
+        if len(level["ix"]) == 0:
+            return level
+        keys = level["ix"] * (1 << 32) + level["iy"]
+        uniq, inverse = np.unique(keys, return_inverse=True)
+        out = {"ix": uniq >> 32, "iy": uniq & ((1 << 32) - 1)}
+        for name in ("count", "sum_lat", "sum_lng", "sum_val", "n_val"):
+            out[name] = np.bincount(inverse, weights=level[name], minlength=len(uniq))
+        # Any one record of the cell, to stand in for it when it holds only that record
+        out["first"] = np.zeros(len(uniq), dtype="int64")
+        out["first"][inverse] = level["first"]
+        return out
+
+    def layer(self, zoom):
+        return self.levels[min(max(int(np.floor(zoom)), 0), self.max_zoom)]
+
+    def body(self, zoom, min_lat=None, max_lat=None, min_lng=None, max_lng=None):
+        return self.layer(zoom).body(min_lat, max_lat, min_lng, max_lng)
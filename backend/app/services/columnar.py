@@ -0,0 +1,146 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:  # pragma: no cover - pyarrow is optional, CSV is always readable
+    pa = None
+
+logger = logging.getLogger("uvicorn")
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PROJECT_DIR = os.path.dirname(BASE_DIR)
+CACHE_DIR = os.getenv("COLUMNAR_CACHE_DIR", os.path.join(BASE_DIR, "cache", "columnar"))
+
+# Rows per record batch (the Arrow IPC "row group")
+ROW_GROUP_ROWS = 4096
+
+# Every CSV the backend reads: path relative to the project root -> (date column, date format)
+# The CSV stays the source of truth; the .arrow copies are derived and rebuilt when it changes.
+SOURCES = {
+    "backend/data/smart_city_air_humidity_2025_2026.csv": ("Date", "%Y-%m-%d"),
+    "backend/data/smart_city_water_quality_2025_2026.csv": ("Date", "%Y-%m-%d"),
+    "backend/data/smart_city_traffic_2025_2026.csv": ("Date", "%Y-%m-%d"),
+    "backend/data/smart_city_crime_2025_2026.csv": ("Date", "%Y-%m-%d"),
+    "backend/data/indian_climate_2024_2025.csv": ("Date", "%Y-%m-%d"),
+    "backend/data/smart_city_traffic_data.csv": ("date_time", "%Y-%m-%d %H:%M:%S"),
+    "data/chennai/chennai_reservoir_levels.csv": ("Date", "%d-%m-%Y"),
+    "data/chennai/chennai_reservoir_rainfall.csv": ("Date", "%d-%m-%Y"),
+}
+AQI_INDIA_SOURCE = ("Timestamp", "%d-%m-%Y")  # data/aqi_india/*_combined.csv
+
+_lock = threading.Lock()
+
+
+def available():
+    return pa is not None
+
+
+def source_spec(csv_path):
+    """(date column, date format) for a known CSV, or (None, None)."""
+    rel = os.path.relpath(os.path.abspath(csv_path), PROJECT_DIR).replace(os.sep, "/")
+    if rel in SOURCES:
+        return SOURCES[rel]
+    if rel.startswith("data/aqi_india/") and rel.endswith("_combined.csv"):
+        return AQI_INDIA_SOURCE
+    return (None, None)
+
+
+def columnar_path(csv_path):
+    """Where the .arrow copy of a CSV lives: mirrored under CACHE_DIR, or keyed on a path hash outside the project."""
+    path = os.path.abspath(csv_path)
+    try:
+        rel = os.path.relpath(path, PROJECT_DIR)
+    except ValueError:  # another drive (Windows)
+        rel = os.pardir
+    if rel == os.pardir or rel.startswith(os.pardir + os.sep):
+        digest = hashlib.sha1(path.encode()).hexdigest()[:16]
+        name = os.path.splitext(os.path.basename(path))[0]
+        return os.path.join(CACHE_DIR, "external", f"{name}-{digest}.arrow")
+    return os.path.join(CACHE_DIR, os.path.splitext(rel)[0] + ".arrow")
+
+
+def _fingerprint(csv_path, dtype, date_col, date_format):
+    """Identifies the CSV contents (mtime/size) and the conversion settings."""
+    st = os.stat(csv_path)
+    spec = json.dumps({"dtype": dtype or {}, "date": [date_col, date_format]}, sort_keys=True)
+    return f"{st.st_mtime_ns}:{st.st_size}:{hashlib.sha1(spec.encode()).hexdigest()[:12]}"
+
+
+def _stored_fingerprint(arrow_path):
+    try:
+        with pa.memory_map(arrow_path, "r") as source:
+            meta = ipc.open_file(source).schema.metadata or {}
+        return meta.get(b"source_fingerprint", b"").decode()
+    except Exception:
+        return None
+
+
+def convert(csv_path, dtype=None, date_col=None, date_format=None):
+    """
+    Converts a CSV to an uncompressed Arrow IPC file (memory-mappable), rows sorted by date
+    and written in ROW_GROUP_ROWS batches. Returns the .arrow path.
+    """
+    if date_col is None:
+        date_col, date_format = source_spec(csv_path)
+    fingerprint = _fingerprint(csv_path, dtype, date_col, date_format)
+
+    df = pd.read_csv(csv_path, dtype=dtype)
+    if date_col and date_col in df.columns:
+        order = pd.to_datetime(df[date_col], format=date_format, errors="coerce").argsort(kind="stable")
+        df = df.iloc[order].reset_index(drop=True)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[b"source_fingerprint"] = fingerprint.encode()
+    table = table.replace_schema_metadata(metadata)
+
+    out = columnar_path(csv_path)
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    tmp = out + ".tmp"
+    with pa.OSFile(tmp, "wb") as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=ROW_GROUP_ROWS)
+    os.replace(tmp, out)
+    logger.info(f"Converted {os.path.basename(csv_path)} -> {out} ({len(df)} rows)")
+    return out
+
+
+def ensure_converted(csv_path, dtype=None, date_col=None, date_format=None):
+    """Returns an up-to-date .arrow path for the CSV, reconverting if the CSV changed."""
+    if date_col is None:
+        date_col, date_format = source_spec(csv_path)
+    out = columnar_path(csv_path)
+    if os.path.exists(out) and _stored_fingerprint(out) == _fingerprint(csv_path, dtype, date_col, date_format):
+        return out
+    with _lock:
+        if os.path.exists(out) and _stored_fingerprint(out) == _fingerprint(csv_path, dtype, date_col, date_format):
+            return out
+        return convert(csv_path, dtype=dtype, date_col=date_col, date_format=date_format)
+
+
+def _restore_nullable(df, dtype):
+    """Arrow hands nullable integer columns back as int64/float64; re-apply the pinned "Int64"."""
+    nullable = {col: t for col, t in (dtype or {}).items() if t == "Int64" and col in df.columns}
+    return df.astype(nullable) if nullable else df
+
+
+def read_table(csv_path, dtype=None):
+    """
+    Loads a dataset as a DataFrame through its memory-mapped columnar copy.
+    Falls back to CSV when pyarrow isn't installed or the conversion fails.
+    """
+    if pa is not None:
+        try:
+            path = ensure_converted(csv_path, dtype=dtype)
+            with pa.memory_map(path, "r") as source:
+                table = ipc.open_file(source).read_all()
+                return _restore_nullable(table.to_pandas(), dtype)
+        except Exception as e:
+            logger.warning(f"Columnar load failed for {csv_path}, reading CSV: {e}")
+    return pd.read_csv(csv_path, dtype=dtype)
@@ -0,0 +1,110 @@
+import os
+import gzip
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional, gzip is always available
+    brotli = None
+
+# Bodies smaller than this aren't worth the CPU (or the header overhead)
+MIN_SIZE = int(os.getenv("COMPRESSION_MIN_BYTES", 1024))
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 5
+
+COMPRESSIBLE_TYPES = ("application/json", "application/geo+json", "text/")
+
+
+def negotiate(accept_encoding):
+    """
+    Picks the encoding for a request from its Accept-Encoding header: "br", "gzip" or None.
+    Honours q-values (q=0 refuses an encoding); brotli wins ties when it is installed.
+    """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    wildcard = accepted.get("*", 0.0)
+    best = max(candidates, key=lambda enc: accepted.get(enc, wildcard), default=None)
+    return best if best and accepted.get(best, wildcard) > 0 else None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # mtime=0 keeps the output byte-identical for identical input
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compressible(media_type):
+    return bool(media_type) and media_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def weak_etag(etag):
+    """A compressed representation is no longer byte-identical to the strong-ETag one."""
+    return etag if etag is None or etag.startswith("W/") else "W/" + etag
+
+
+class CompressionMiddleware:
+    """
+    Compresses complete (non-streaming) responses with the encoding negotiated per request.
+    Responses that already carry a Content-Encoding, aren't JSON/text, or are below MIN_SIZE
+    pass through untouched, as do streamed bodies.
+    """
+
+    def __init__(self, app, minimum_size=MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                # Hold the headers until the first body chunk shows what we're dealing with
+                start = message
+                return
+
+            passthrough = True
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            if (message.get("more_body") or "content-encoding" in headers
+                    or not compressible(headers.get("content-type")) or len(body) < self.minimum_size):
+                await send(start)
+                await send(message)
+                return
+
+            body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            if "etag" in headers:
+                headers["ETag"] = weak_etag(headers["etag"])
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,160 @@
+import os
+import threading
+import logging
+from app.services.columnar import read_table
+
+logger = logging.getLogger("uvicorn")
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+PROJECT_DIR = os.path.dirname(BASE_DIR)
+
+# Known datasets: name -> (file under backend/data, pinned dtypes)
+# Pinning dtypes skips pandas' type inference and keeps the frames stable between reloads.
+# Count columns are nullable ("Int64") so a blank cell in an appended row loads as <NA>.
+DATASETS = {
+    "air_quality": ("smart_city_air_humidity_2025_2026.csv", {
+        "Date": "str", "City": "str", "StationName": "str", "StationId": "str",
+        "Latitude": "float64", "Longitude": "float64",
+        "Temperature_Max_C": "float64", "Temperature_Min_C": "float64",
+        "Humidity_Percent": "float64", "Rainfall_mm": "float64",
+        "AQI": "Int64", "PM2.5": "float64", "PM10": "float64", "NO2": "float64",
+        "AQI_Category": "str",
+    }),
+    "water_quality": ("smart_city_water_quality_2025_2026.csv", {
+        "Date": "str", "Location": "str", "StationCode": "str", "State": "str",
+        "Latitude": "float64", "Longitude": "float64",
+        "pH": "float64", "WQI": "float64", "DO": "float64", "BOD": "float64",
+        "Safety_Status": "str", "Turbidity_NTU": "float64",
+    }),
+    "traffic": ("smart_city_traffic_2025_2026.csv", {
+        "Date": "str", "City": "str", "Location_ID": "str",
+        "Latitude": "float64", "Longitude": "float64",
+        "Daily_Vehicle_Count": "Int64", "Average_Speed_kmh": "float64",
+        "Avg_Congestion_Level": "str",
+    }),
+    "crime": ("smart_city_crime_2025_2026.csv", {
+        "Date": "str", "City": "str", "Latitude": "float64", "Longitude": "float64",
+        "Crime_Type": "str", "Daily_Incidents": "Int64", "Investigation_Status": "str",
+    }),
+}
+
+_RESERVOIR_DTYPE = {"Date": "str", "POONDI": "float64", "CHOLAVARAM": "float64",
+                    "REDHILLS": "float64", "CHEMBARAMBAKKAM": "float64"}
+
+# Datasets kept in the project-level data/ folder: name -> (path under the project root, pinned dtypes)
+PROJECT_DATASETS = {
+    "chennai_levels": ("data/chennai/chennai_reservoir_levels.csv", _RESERVOIR_DTYPE),
+    "chennai_rainfall": ("data/chennai/chennai_reservoir_rainfall.csv", _RESERVOIR_DTYPE),
+}
+
+
+class DatasetRegistry:
+    """
+    Process-wide cache of the CSV datasets.
+    Each file is loaded once and only reloaded when the CSV's mtime changes.
+    Frames handed out are shared between requests, so callers must treat them as read-only.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._sources = {}   # name -> (path, dtype)
+        self._entries = {}   # name -> {"df", "mtime", "version", "views"}
+        self._stats = {}     # name -> {"loads", "hits"}
+
+    def register(self, name, path, dtype=None):
+        with self._lock:
+            self._sources[name] = (path, dtype)
+            self._entries.pop(name, None)
+            self._stats.setdefault(name, {"loads": 0, "hits": 0})
+
+    def path(self, name):
+        return self._sources[name][0]
+
+    def sources(self):
+        """name -> (path, pinned dtype) for every registered dataset."""
+        return dict(self._sources)
+
+    def exists(self, name):
+        return name in self._sources and os.path.exists(self._sources[name][0])
+
+    def _entry(self, name):
+        path, dtype = self._sources[name]
+        mtime = os.stat(path).st_mtime_ns
+
+        entry = self._entries.get(name)
+        if entry is not None and entry["mtime"] == mtime:
+            self._stats[name]["hits"] += 1
+            return entry
+
+        with self._lock:
+            # Another request may have reloaded it while we waited
+            entry = self._entries.get(name)
+            if entry is not None and entry["mtime"] == mtime:
+                self._stats[name]["hits"] += 1
+                return entry
+
+            # CSV is the source of truth; read through its memory-mapped columnar copy
+            df = read_table(path, dtype=dtype)
+            version = (entry["version"] + 1) if entry else 1
+            entry = {"df": df, "mtime": mtime, "version": version, "views": {}}
+            self._entries[name] = entry
+            self._stats[name]["loads"] += 1
+            logger.info(f"Dataset '{name}' loaded (v{version}, {len(df)} rows)")
+            return entry
+
+    def get(self, name):
+        """
+        Returns the DataFrame for a dataset, reloading it if the file changed on disk.
+        Raises FileNotFoundError if the source file is missing.
+        """
+        return self._entry(name)["df"]
+
+    def version(self, name):
+        """Current version number of a dataset (bumps on every reload)."""
+        return self._entry(name)["version"]
+
+    def revision(self, name):
+        """
+        Identity of the dataset's file on disk ("mtime_ns-size"). Unlike version(), it is the same
+        across restarts and worker processes, and reading it never loads the data.
+        """
+        st = os.stat(self._sources[name][0])
+        return f"{st.st_mtime_ns}-{st.st_size}"
+
+    def derive(self, name, key, build):
+        """
+        Returns build(df) for the current version of a dataset.
+        The result is cached alongside the frame and dropped when the file is reloaded,
+        so indexes and precomputed views never outlive the data they were built from.
+        """
+        entry = self._entry(name)
+        views = entry["views"]
+        if key not in views:
+            with self._lock:
+                if key not in views:
+                    views[key] = build(entry["df"])
+        return views[key]
+
+    def stats(self):
+        datasets = {}
+        for name, counters in self._stats.items():
+            entry = self._entries.get(name)
+            datasets[name] = {
+                "loads": counters["loads"],
+                "hits": counters["hits"],
+                "version": entry["version"] if entry else None,
+                "rows": len(entry["df"]) if entry else None,
+            }
+        return {
+            "loads": sum(d["loads"] for d in datasets.values()),
+            "hits": sum(d["hits"] for d in datasets.values()),
+            "datasets": datasets,
+        }
+
+
+registry = DatasetRegistry()
+for _name, (_file, _dtype) in DATASETS.items():
+    registry.register(_name, os.path.join(DATA_DIR, _file), dtype=_dtype)
+for _name, (_file, _dtype) in PROJECT_DATASETS.items():
+    registry.register(_name, os.path.join(PROJECT_DIR, _file), dtype=_dtype)
@@ -0,0 +1,40 @@
+import numpy as np
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    Returns the indices (ascending) of at most n_out points that keep the series' visual shape:
+    first and last points are always kept, and each bucket in between contributes the point
+    forming the largest triangle with the previous pick and the next bucket's mean.
+    """
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    n = len(x)
+    if n_out >= n or n <= 2:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])[:max(n_out, 1)]
+
+    # Bucket edges over the interior points 1..n-2
+    edges = (np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype("int64") + 1
+    edges[-1] = n - 1
+
+    # Mean of each bucket, used as the third triangle vertex for the bucket before it
+    csum_x = np.concatenate([[0.0], np.cumsum(x)])
+    csum_y = np.concatenate([[0.0], np.cumsum(y)])
+    sizes = edges[1:] - edges[:-1]
+    mean_x = np.append((csum_x[edges[1:]] - csum_x[edges[:-1]]) / sizes, x[-1])
+    mean_y = np.append((csum_y[edges[1:]] - csum_y[edges[:-1]]) / sizes, y[-1])
+
+    picks = np.empty(n_out, dtype="int64")
+    picks[0], picks[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        cx, cy = mean_x[i + 1], mean_y[i + 1]
+        # Twice the triangle area (a, candidate, next bucket mean); the factor doesn't change argmax
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(area.argmax())
+        picks[i + 1] = a
+    return picks
@@ -0,0 +1,172 @@
+import os
+import re
+import json
+import bisect
+import threading
+import logging
+from app.services.datasets import registry
+
+logger = logging.getLogger("uvicorn")
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PROJECT_DIR = os.path.dirname(BASE_DIR)
+STATIONS_FILE = os.path.join(PROJECT_DIR, "data", "station_coordinates.json")
+LEARNED_FILE = os.getenv("GAZETTEER_PATH", os.path.join(BASE_DIR, "cache", "gazetteer.json"))
+
+# Datasets whose station/city names seed the index
+SEED_DATASETS = {
+    "air_quality": ("StationName", "City", "station"),
+    "water_quality": ("Location", "State", "reservoir"),
+}
+
+# Prefix matches scanned per query before ranking
+MAX_SCAN = 256
+# Learned Nominatim results kept on disk (oldest dropped first)
+MAX_LEARNED = 10000
+
+
+def normalize(text):
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", str(text).lower())).strip()
+
+
+class Gazetteer:
+    """
+    In-process place index for typeahead search.
+
+    Every place is indexed under each word-suffix of its name ("punjabi bagh", "bagh", ...),
+    kept in one sorted list so a prefix lookup is a bisect plus a short scan.
+    Seeded from the datasets and station_coordinates.json; Nominatim results are
+    learned at runtime and persisted so they survive restarts.
+    """
+
+    def __init__(self, learned_path=LEARNED_FILE):
+        self.learned_path = learned_path
+        self._lock = threading.Lock()
+        self._entries = []     # id -> result dict (Nominatim-shaped)
+        self._keys = []        # sorted (key, entry id)
+        self._seen = {}        # dedupe: (display_name, lat, lon) -> entry id
+        self._learned = []     # raw learned records, persisted as JSON
+        self._seed_versions = None
+
+    # --- building ---
+
+    def _add(self, result, aliases=(), importance=0.0):
+        ident = (result.get("display_name"), str(result.get("lat")), str(result.get("lon")))
+        if ident in self._seen:
+            entry_id = self._seen[ident]
+        else:
+            entry_id = len(self._entries)
+            result.setdefault("importance", importance)
+            self._entries.append(result)
+            self._seen[ident] = entry_id
+
+        names = [result.get("display_name", "")] + list(aliases)
+        for name in names:
+            words = normalize(name).split(" ")
+            for i in range(len(words)):
+                key = " ".join(words[i:])
+                if key:
+                    bisect.insort(self._keys, (key, entry_id))
+
+    def _seed(self, versions):
+        self._entries, self._keys, self._seen = [], [], {}
+
+        # 1. Geocoded AQI stations
+        try:
+            with open(STATIONS_FILE) as f:
+                stations = json.load(f)
+            for name, info in stations.items():
+                self._add({"display_name": name, "lat": str(info["lat"]), "lon": str(info["lng"]),
+                           "type": "station", "source": "local"}, importance=0.6)
+        except Exception as e:
+            logger.warning(f"Gazetteer: station coordinates not loaded: {e}")
+
+        # 2. Dataset stations, plus one centroid per city across all datasets
+        city_points = {}
+        for name, (place_col, city_col, kind) in SEED_DATASETS.items():
+            if not registry.exists(name):
+                continue
+            df = registry.get(name)
+            places = df.groupby([place_col, city_col])[["Latitude", "Longitude"]].mean().reset_index()
+            for row in places.itertuples(index=False):
+                self._add({"display_name": f"{row[0]}, {row[1]}, India", "lat": f"{row[2]:.6f}",
+                           "lon": f"{row[3]:.6f}", "type": kind, "source": "local"}, importance=0.4)
+                city_points.setdefault(row[1], []).append((row[2], row[3]))
+        for city, points in city_points.items():
+            lat = sum(p[0] for p in points) / len(points)
+            lng = sum(p[1] for p in points) / len(points)
+            self._add({"display_name": f"{city}, India", "lat": f"{lat:.6f}", "lon": f"{lng:.6f}",
+                       "type": "city", "source": "local"}, importance=0.8)
+
+        # 3. Past Nominatim results
+        if not self._learned and os.path.exists(self.learned_path):
+            try:
+                with open(self.learned_path) as f:
+                    self._learned = json.load(f)
+            except Exception as e:
+                logger.warning(f"Gazetteer: learned entries not loaded: {e}")
+        for record in self._learned:
+            self._add(dict(record["result"]), aliases=[record.get("query", "")],
+                      importance=float(record["result"].get("importance") or 0.5))
+
+        self._seed_versions = versions
+        logger.info(f"Gazetteer built: {len(self._entries)} places, {len(self._keys)} keys")
+
+    def _ensure_built(self):
+        versions = tuple(registry.version(n) if registry.exists(n) else None for n in SEED_DATASETS)
+        if versions != self._seed_versions:
+            with self._lock:
+                if versions != self._seed_versions:
+                    self._seed(versions)
+
+    # --- querying ---
+
+    def search(self, query, limit=5):
+        """Places whose name (or any word-suffix of it) starts with the query, best first."""
+        self._ensure_built()
+        q = normalize(query)
+        if not q:
+            return []
+
+        keys = self._keys
+        i = bisect.bisect_left(keys, (q, -1))
+        matches = {}
+        for key, entry_id in keys[i:i + MAX_SCAN]:
+            if not key.startswith(q):
+                break
+            # Whole-word matches rank above partial ones
+            exact = key == q or key.startswith(q + " ")
+            matches[entry_id] = matches.get(entry_id, False) or exact
+
+        ranked = sorted(
+            matches.items(),
+            key=lambda m: (not m[1], -float(self._entries[m[0]].get("importance") or 0),
+                           len(self._entries[m[0]].get("display_name", ""))),
+        )
+        return [self._entries[entry_id] for entry_id, _ in ranked[:limit]]
+
+    def learn(self, query, results):
+        """Adds Nominatim results to the index (also under the query text) and persists them."""
+        if not results:
+            return
+        self._ensure_built()
+        with self._lock:
+            for result in results:
+                record = {"query": query, "result": result}
+                self._learned.append(record)
+                self._add(dict(result), aliases=[query], importance=float(result.get("importance") or 0.5))
+            self._learned = self._learned[-MAX_LEARNED:]
+            try:
+                os.makedirs(os.path.dirname(self.learned_path), exist_ok=True)
+                tmp = self.learned_path + ".tmp"
+                with open(tmp, "w") as f:
+                    json.dump(self._learned, f)
+                os.replace(tmp, self.learned_path)
+            except OSError as e:
+                logger.warning(f"Gazetteer: could not persist learned entries: {e}")
+
+    def stats(self):
+        return {"places": len(self._entries), "keys": len(self._keys), "learned": len(self._learned)}
+
+
+gazetteer = Gazetteer()
@@ -0,0 +1,157 @@
+import os
+import time
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from app.services import http
+
+logger = logging.getLogger("uvicorn")
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH", os.path.join(BASE_DIR, "cache", "reverse_geocode.sqlite3"))
+
+NOMINATIM_REVERSE_URL = "https://nominatim.openstreetmap.org/reverse"
+HEADERS = {'User-Agent': 'SmartCityProbe/1.0'}
+
+# 3 decimals ~ 110 m: close enough to share a street name
+PRECISION = int(os.getenv("GEOCODE_PRECISION", "3"))
+MEMORY_SIZE = 4096
+# Nominatim usage policy: at most 1 request per second
+MIN_INTERVAL_S = 1.0
+MAX_PENDING = 64
+# Don't retry a failed coordinate for a while
+FAILURE_BACKOFF_S = 300
+
+
+def fallback_address(lat, lng):
+    return f"Coord: {lat:.4f}, {lng:.4f}"
+
+
+class ReverseGeocodeCache:
+    """
+    Two-tier reverse geocode cache keyed on quantized coordinates:
+    an in-memory LRU in front of a SQLite file that survives restarts.
+    Misses never block the caller; the lookup is queued on a single background
+    worker that spaces Nominatim calls to respect its rate limit.
+    """
+
+    def __init__(self, path=CACHE_PATH, precision=PRECISION, memory_size=MEMORY_SIZE):
+        self.precision = precision
+        self.memory_size = memory_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._failed = {}
+        self._last_request = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reverse-geocode")
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "fetches": 0, "errors": 0, "dropped": 0}
+
+        self._db = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS reverse_geocode ("
+                "key TEXT PRIMARY KEY, address TEXT NOT NULL, fetched_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Reverse geocode cache disabled on disk: {e}")
+            self._db = None
+
+    def key(self, lat, lng):
+        return f"{round(lat, self.precision):.{self.precision}f},{round(lng, self.precision):.{self.precision}f}"
+
+    def _remember(self, key, address):
+        self._memory[key] = address
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def lookup(self, lat, lng):
+        """
+        Returns the cached address for a coordinate, or None on a miss
+        (in which case a background fetch is scheduled).
+        """
+        key = self.key(lat, lng)
+        with self._lock:
+            address = self._memory.get(key)
+            if address is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return address
+
+            if self._db is not None:
+                row = self._db.execute("SELECT address FROM reverse_geocode WHERE key = ?", (key,)).fetchone()
+                if row:
+                    self._remember(key, row[0])
+                    self._stats["disk_hits"] += 1
+                    return row[0]
+
+            self._stats["misses"] += 1
+            self._schedule(key)
+        return None
+
+    def _schedule(self, key):
+        # Caller holds the lock
+        if key in self._pending:
+            return
+        if time.time() - self._failed.get(key, 0) < FAILURE_BACKOFF_S:
+            return
+        if len(self._pending) >= MAX_PENDING:
+            self._stats["dropped"] += 1
+            return
+        self._pending.add(key)
+        self._executor.submit(self._fill, key)
+
+    def _fill(self, key):
+        try:
+            wait = self._last_request + MIN_INTERVAL_S - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_request = time.time()
+
+            lat, lng = key.split(",")
+            self._stats["fetches"] += 1
+            r = http.request_sync("nominatim", "GET", NOMINATIM_REVERSE_URL,
+                                  params={"lat": lat, "lon": lng, "format": "json"}, headers=HEADERS)
+            address = r.json().get('display_name')
+            if not address:
+                raise ValueError("no display_name in response")
+            # simplify address
+            address = ", ".join(address.split(",")[:3])
+
+            with self._lock:
+                self._remember(key, address)
+                if self._db is not None:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO reverse_geocode (key, address, fetched_at) VALUES (?, ?, ?)",
+                        (key, address, time.time()),
+                    )
+                    self._db.commit()
+                self._failed.pop(key, None)
+        except Exception as e:
+            logger.warning(f"Reverse geocode failed for {key}: {e}")
+            with self._lock:
+                self._stats["errors"] += 1
+                now = time.time()
+                self._failed[key] = now
+                if len(self._failed) > self.memory_size:
+                    self._failed = {k: t for k, t in self._failed.items() if now - t < FAILURE_BACKOFF_S}
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "memory_entries": len(self._memory), "pending": len(self._pending)}
+
+
+reverse_cache = ReverseGeocodeCache()
+
+
+def reverse_geocode(lat, lng):
+    """Street-level address for a coordinate; falls back to the coordinate string on a cache miss."""
+    return reverse_cache.lookup(lat, lng) or fallback_address(lat, lng)
@@ -0,0 +1,138 @@
+import json
+import numpy as np
+import pandas as pd
+from app.services.spatial import GridIndex, has_bbox
+
+EMPTY_COLLECTION = b'{"type":"FeatureCollection","features":[]}'
+
+
+class Const:
+    """Property value that is the same for every feature (encoded once)."""
+
+    def __init__(self, value):
+        self.value = value
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, default=_json_default)
+
+
+def encode_column(values):
+    """
+    Encodes a column as a list of JSON tokens, one per row.
+    Works on whole arrays at a time; NaN/inf/missing become null.
+    """
+    values = pd.Series(values) if not isinstance(values, pd.Series) else values
+    dtype = values.dtype
+
+    if pd.api.types.is_bool_dtype(dtype):
+        return np.where(values.to_numpy(dtype=bool), "true", "false").tolist()
+
+    if pd.api.types.is_integer_dtype(dtype) and not values.hasnans:
+        return list(map(int.__repr__, values.to_numpy(dtype="int64").tolist()))
+
+    if pd.api.types.is_numeric_dtype(dtype):
+        arr = values.to_numpy(dtype="float64", na_value=np.nan)
+        tokens = np.array(list(map(float.__repr__, arr.tolist())), dtype=object)
+        tokens[~np.isfinite(arr)] = "null"
+        return tokens.tolist()
+
+    # Strings / objects: encode each distinct value once, then fan out by code
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    encoded = np.array([_dumps(v) for v in uniques] + ["null"], dtype=object)
+    return encoded[np.where(codes < 0, len(uniques), codes)].tolist()
+
+
+def encode_features(df, properties, lat_col="Latitude", lon_col="Longitude"):
+    """
+    Encodes each row of a DataFrame as a GeoJSON Feature string.
+
+    properties maps output key -> column name (or Const(value) for a fixed value).
+    The caller is expected to have dropped rows without finite coordinates.
+    """
+    if df is None or len(df) == 0:
+        return []
+
+    # One printf-style template per collection; only per-row tokens vary
+    prop_parts = []
+    columns = [encode_column(df[lon_col].astype("float64")), encode_column(df[lat_col].astype("float64"))]
+    for key, source in properties.items():
+        key_json = _dumps(str(key)).replace("%", "%%")
+        if isinstance(source, Const):
+            prop_parts.append(f"{key_json}:{_dumps(source.value).replace('%', '%%')}")
+        else:
+            prop_parts.append(f"{key_json}:%s")
+            columns.append(encode_column(df[source]))
+
+    template = (
+        '{"type":"Feature","geometry":{"type":"Point","coordinates":[%s,%s]},'
+        '"properties":{' + ",".join(prop_parts) + "}}"
+    )
+    return [template % row for row in zip(*columns)]
+
+
+def collection_bytes(features):
+    """Wraps already-encoded Feature strings in a FeatureCollection."""
+    return ('{"type":"FeatureCollection","features":[' + ",".join(features) + "]}").encode("utf-8")
+
+
+def _with_coordinates(df, lat_col, lon_col):
+    lats = df[lat_col].to_numpy(dtype="float64", na_value=np.nan)
+    lons = df[lon_col].to_numpy(dtype="float64", na_value=np.nan)
+    keep = np.isfinite(lats) & np.isfinite(lons)
+    return df if keep.all() else df[keep]
+
+
+def encode_feature_collection(df, properties, lat_col="Latitude", lon_col="Longitude"):
+    """
+    Serializes a DataFrame slice straight to GeoJSON FeatureCollection bytes.
+
+    properties maps output key -> column name (or Const(value) for a fixed value).
+    Rows without finite coordinates are skipped.
+    """
+    if df is None or len(df) == 0:
+        return EMPTY_COLLECTION
+    df = _with_coordinates(df, lat_col, lon_col)
+    if len(df) == 0:
+        return EMPTY_COLLECTION
+    return collection_bytes(encode_features(df, properties, lat_col=lat_col, lon_col=lon_col))
+
+
+class FeatureLayer:
+    """
+    Materialized, ready-to-serve point layer: every row pre-encoded as a Feature string,
+    a grid index over the same rows, and the full collection body.
+    Build it once per dataset version (registry.derive); a request then only picks
+    fragments by bbox and joins them.
+    `features` optionally supplies the encoded Feature strings, one per row of df
+    (every row must then have coordinates).
+    """
+
+    def __init__(self, df, properties, lat_col="Latitude", lon_col="Longitude", features=None):
+        self.frame = _with_coordinates(df, lat_col, lon_col).reset_index(drop=True)
+        if features is None:
+            features = encode_features(self.frame, properties, lat_col=lat_col, lon_col=lon_col)
+        self.features = np.array(features, dtype=object)
+        self.index = GridIndex.from_frame(self.frame, lat_col=lat_col, lon_col=lon_col)
+        self.full_body = collection_bytes(self.features.tolist())
+
+    def __len__(self):
+        return len(self.features)
+
+    def positions(self, min_lat=None, max_lat=None, min_lng=None, max_lng=None):
+        """Row positions inside the bbox (all rows when no bbox is given)."""
+        if not has_bbox(min_lat, max_lat, min_lng, max_lng):
+            return np.arange(len(self.features))
+        return self.index.query(min_lat, max_lat, min_lng, max_lng)
+
+    def body(self, min_lat=None, max_lat=None, min_lng=None, max_lng=None):
+        if not has_bbox(min_lat, max_lat, min_lng, max_lng):
+            return self.full_body
+        hits = self.index.query(min_lat, max_lat, min_lng, max_lng)
+        return collection_bytes(self.features[hits].tolist())
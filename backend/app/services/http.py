@@ -0,0 +1,279 @@
+import time
+import random
+import asyncio
+import threading
+import logging
+import httpx
+
+logger = logging.getLogger("uvicorn")
+
+USER_AGENT = "SmartCityDashboard/Backend-1.0"
+
+# Per-upstream policy. Each upstream gets its own keep-alive pool, so a slow one
+# can't take every connection, and its own circuit breaker.
+#   retries: extra attempts after the first, for connect errors, timeouts, 429 and 5xx
+#   retry_read_timeouts: False on slow upstreams, where a read timeout already cost the full
+#       timeout and retrying would only multiply how long a caller (and a worker) is held
+#   failure_threshold: consecutive failed calls that open the breaker
+#   reset_s: how long an open breaker rejects calls before letting one trial through
+UPSTREAMS = {
+    "nominatim": {"timeout": httpx.Timeout(5.0, connect=2.0), "retries": 1, "max_connections": 4,
+                  "failure_threshold": 3, "reset_s": 60.0},
+    "overpass": {"timeout": httpx.Timeout(30.0, connect=3.0), "retries": 2, "retry_read_timeouts": False,
+                 "max_connections": 8, "failure_threshold": 3, "reset_s": 60.0},
+    "open-meteo": {"timeout": httpx.Timeout(4.0, connect=2.0), "retries": 1, "max_connections": 16,
+                   "failure_threshold": 5, "reset_s": 30.0},
+}
+# Full-jitter exponential backoff: sleep uniform(0, min(cap, base * 2**attempt))
+BACKOFF_BASE_S = 0.25
+BACKOFF_CAP_S = 2.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class UpstreamError(Exception):
+    def __init__(self, upstream, message):
+        super().__init__(f"{upstream}: {message}")
+        self.upstream = upstream
+
+
+class UpstreamUnavailable(UpstreamError):
+    """Raised without touching the network while the upstream's circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures; open rejects calls for
+    `reset_s`, then half-open lets a single trial call through: success closes, failure re-opens.
+    """
+
+    def __init__(self, name, failure_threshold, reset_s):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_s = reset_s
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial = False
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_s:
+                self.state = "half_open"
+                self._trial = False
+            if self.state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial = False
+
+    def release(self):
+        """Gives back a half-open trial that ended without an outcome."""
+        with self._lock:
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning(f"Circuit for {self.name} opened after {self.failures} consecutive failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._trial = False
+
+
+class Upstream:
+    """Policy, breaker and counters for one upstream host."""
+
+    def __init__(self, name, timeout, retries, max_connections, failure_threshold, reset_s,
+                 retry_read_timeouts=True):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_read_timeouts = retry_read_timeouts
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_connections)
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_s)
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "successes": 0, "failures": 0, "retries": 0, "rejected": 0}
+        self.latency_ms_total = 0.0
+        self.latency_ms_max = 0.0
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def observe(self, started):
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.latency_ms_total += elapsed
+            self.latency_ms_max = max(self.latency_ms_max, elapsed)
+
+    def stats(self):
+        with self._lock:
+            calls = self.counters["calls"]
+            return {
+                **self.counters,
+                "state": self.breaker.state,
+                "consecutive_failures": self.breaker.failures,
+                "avg_latency_ms": round(self.latency_ms_total / calls, 1) if calls else None,
+                "max_latency_ms": round(self.latency_ms_max, 1),
+            }
+
+
+upstreams = {name: Upstream(name, **policy) for name, policy in UPSTREAMS.items()}
+
+_async_clients = {}   # (event loop, upstream) -> AsyncClient
+_sync_clients = {}    # upstream -> Client
+_sync_lock = threading.Lock()
+
+
+def _new_client(cls, upstream):
+    return cls(timeout=upstream.timeout, limits=upstream.limits, headers={"User-Agent": USER_AGENT})
+
+
+def client(name):
+    """
+    The async client (keep-alive pool) for an upstream on the running event loop.
+    Connection pools can't be shared across loops, so a loop that isn't the server's
+    (tests, scripts) gets its own.
+    """
+    loop = asyncio.get_running_loop()
+    http = _async_clients.get((loop, name))
+    if http is None or http.is_closed:
+        for key in [k for k in _async_clients if k[0].is_closed()]:
+            _async_clients.pop(key, None)
+        http = _new_client(httpx.AsyncClient, upstreams[name])
+        _async_clients[(loop, name)] = http
+    return http
+
+
+def sync_client(name):
+    """Blocking client for an upstream, for background worker threads."""
+    with _sync_lock:
+        http = _sync_clients.get(name)
+        if http is None:
+            http = _sync_clients[name] = _new_client(httpx.Client, upstreams[name])
+        return http
+
+
+def _backoff(attempt):
+    return random.uniform(0, min(BACKOFF_CAP_S, BACKOFF_BASE_S * 2 ** attempt))
+
+
+def _retryable(error):
+    """Errors that count against the upstream's health (and are worth another attempt)."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRY_STATUS
+    return isinstance(error, httpx.TransportError)
+
+
+def _should_retry(upstream, error, attempt):
+    if attempt >= upstream.retries or not _retryable(error):
+        return False
+    return upstream.retry_read_timeouts or not isinstance(error, httpx.ReadTimeout)
+
+
+def _abandon(upstream, started, last_error):
+    """
+    The call was cancelled (e.g. a caller's deadline) or hit a local error. If an attempt had
+    already failed against the upstream (typically a timeout, with the retry cut short), that
+    is recorded so the breaker still sees it; otherwise there is no verdict on the upstream.
+    """
+    if last_error is not None:
+        _finish(upstream, started, last_error)
+    else:
+        upstream.breaker.release()
+
+
+def _begin(upstream):
+    if not upstream.breaker.allow():
+        upstream.count("rejected")
+        raise UpstreamUnavailable(upstream.name, "circuit open, failing fast")
+    upstream.count("calls")
+
+
+def _finish(upstream, started, error):
+    """Records the outcome of a call; 4xx other than 429 means the upstream is healthy."""
+    upstream.observe(started)
+    if error is None or not _retryable(error):
+        upstream.breaker.success()
+        upstream.count("successes" if error is None else "failures")
+    else:
+        upstream.breaker.failure()
+        upstream.count("failures")
+
+
+async def request(name, method, url, **kwargs):
+    """
+    Calls an upstream with bounded, jittered retries behind its circuit breaker.
+    Returns the 2xx response; raises UpstreamUnavailable while the circuit is open,
+    otherwise the last httpx error.
+    """
+    upstream = upstreams[name]
+    _begin(upstream)
+    started = time.perf_counter()
+    last_error = None
+    for attempt in range(upstream.retries + 1):
+        try:
+            if attempt:
+                upstream.count("retries")
+                await asyncio.sleep(_backoff(attempt - 1))
+            resp = await client(name).request(method, url, **kwargs)
+            resp.raise_for_status()
+        except httpx.HTTPError as e:
+            if _should_retry(upstream, e, attempt):
+                last_error = e
+                continue
+            _finish(upstream, started, e)
+            raise
+        except BaseException:
+            _abandon(upstream, started, last_error)
+            raise
+        _finish(upstream, started, None)
+        return resp
+
+
+def request_sync(name, method, url, **kwargs):
+    """Blocking variant of request() for worker threads; same retries, breaker and counters."""
+    upstream = upstreams[name]
+    _begin(upstream)
+    started = time.perf_counter()
+    last_error = None
+    for attempt in range(upstream.retries + 1):
+        try:
+            if attempt:
+                upstream.count("retries")
+                time.sleep(_backoff(attempt - 1))
+            resp = sync_client(name).request(method, url, **kwargs)
+            resp.raise_for_status()
+        except httpx.HTTPError as e:
+            if _should_retry(upstream, e, attempt):
+                last_error = e
+                continue
+            _finish(upstream, started, e)
+            raise
+        except BaseException:
+            _abandon(upstream, started, last_error)
+            raise
+        _finish(upstream, started, None)
+        return resp
+
+
+def stats():
+    return {name: upstream.stats() for name, upstream in upstreams.items()}
+
+
+async def aclose():
+    """Closes the current loop's clients (app shutdown)."""
+    loop = asyncio.get_running_loop()
+    for key in [k for k in _async_clients if k[0] is loop]:
+        await _async_clients.pop(key).aclose()
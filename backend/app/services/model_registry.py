@@ -0,0 +1,129 @@
+import os
+import time
+import pickle
+import hashlib
+import threading
+import logging
+from datetime import datetime, timezone
+
+logger = logging.getLogger("uvicorn")
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+MODEL_DIR = os.path.join(BASE_DIR, "model")
+
+ARTIFACTS = {
+    "model": "climate_model.pkl",
+    "encoder": "climate_encoder.pkl",
+    "features": "climate_features.pkl",
+}
+
+# How often requests are allowed to stat the pickles for changes
+CHECK_INTERVAL_S = 2.0
+
+
+class ModelBundle:
+    """One consistent set of model/encoder/feature-list artifacts."""
+
+    def __init__(self, model, encoder, features, version, mtimes):
+        self.model = model
+        self.encoder = encoder
+        self.features = list(features)
+        self.version = version
+        self.mtimes = mtimes
+        self.loaded_at = datetime.now(timezone.utc)
+
+    def info(self):
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at.isoformat(),
+            "features": self.features,
+            "classes": [str(c) for c in getattr(self.encoder, "classes_", [])],
+        }
+
+
+class ModelRegistry:
+    """
+    Keeps the climate model in memory and hot-swaps it when the pickles change on disk.
+    A new bundle is fully loaded before it replaces the old one, so a request always
+    sees a complete set of artifacts; if loading fails the previous bundle stays live.
+    """
+
+    def __init__(self, model_dir=MODEL_DIR):
+        self.model_dir = model_dir
+        self._bundle = None
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self._swaps = 0
+
+    def _paths(self):
+        return {name: os.path.join(self.model_dir, file) for name, file in ARTIFACTS.items()}
+
+    def _mtimes(self):
+        return {name: os.stat(path).st_mtime_ns for name, path in self._paths().items()}
+
+    @staticmethod
+    def _check(artifacts):
+        """
+        Rejects a set of artifacts that don't belong together, e.g. read while the pickles are
+        being replaced one by one: the feature list must be the one the model was fitted on,
+        and the encoder must label exactly the model's classes.
+        """
+        model, encoder, features = artifacts["model"], artifacts["encoder"], list(artifacts["features"])
+        fitted = getattr(model, "feature_names_in_", None)
+        if len(features) != model.n_features_in_ or (fitted is not None and list(fitted) != features):
+            raise ValueError("feature list does not match the one the model was fitted on")
+        if len(encoder.classes_) != len(model.classes_):
+            raise ValueError(f"encoder has {len(encoder.classes_)} classes, model {len(model.classes_)}")
+
+    def _load(self, mtimes):
+        artifacts = {}
+        digest = hashlib.sha256()
+        for name, path in self._paths().items():
+            with open(path, "rb") as f:
+                raw = f.read()
+            digest.update(raw)
+            artifacts[name] = pickle.loads(raw)
+        self._check(artifacts)
+        return ModelBundle(artifacts["model"], artifacts["encoder"], artifacts["features"],
+                           version=digest.hexdigest()[:12], mtimes=mtimes)
+
+    def load(self):
+        """Loads (or reloads) the artifacts from disk and swaps them in."""
+        with self._lock:
+            mtimes = self._mtimes()
+            bundle = self._load(mtimes)
+            previous = self._bundle
+            self._bundle = bundle
+            self._last_check = time.monotonic()
+            if previous is not None:
+                self._swaps += 1
+            logger.info(f"Climate model loaded (version {bundle.version})")
+            return bundle
+
+    def current(self):
+        """Returns the live bundle, picking up new pickles at most every CHECK_INTERVAL_S."""
+        bundle = self._bundle
+        if bundle is None:
+            return self.load()
+
+        now = time.monotonic()
+        if now - self._last_check < CHECK_INTERVAL_S:
+            return bundle
+        self._last_check = now
+
+        try:
+            if self._mtimes() != bundle.mtimes:
+                return self.load()
+        except Exception as e:
+            # Half-written, missing or mismatched pickles: keep serving the previous model, retry later
+            logger.error(f"Model reload failed, keeping version {bundle.version}: {e}")
+        return self._bundle
+
+    def info(self):
+        bundle = self._bundle
+        if bundle is None:
+            return {"loaded": False}
+        return {"loaded": True, "swaps": self._swaps, **bundle.info()}
+
+
+model_registry = ModelRegistry()
@@ -1,16 +1,27 @@
-import requests
+import asyncio
 from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
 import logging
+from app.services import http
+from app.services.cache import TTLCache
+from app.services.gazetteer import gazetteer
+from app.services.places import PLACE_TYPES, TILE_DEG, TILE_TTL_S, place_store, tile_of, tiles_around, tiles_for_bbox
 
 logger = logging.getLogger("uvicorn")
 
 NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
 OVERPASS_URL = "https://overpass-api.de/api/interpreter"
 
-def search_location(query: str):
+async def search_location(query: str):
     """
-    Search location using Nominatim API.
+    Search location: local gazetteer first, Nominatim only on a miss.
+    Nominatim results are fed back into the gazetteer.
     """
+    # May (re)load the city datasets and rebuild the prefix index: keep it off the event loop
+    local = await run_in_threadpool(gazetteer.search, query)
+    if local:
+        return local
+
     params = {
         "q": query,
         "format": "json",
@@ -18,18 +29,147 @@ def search_location(query: str):
         "addressdetails": 1,
         "countrycodes": "in" # Limit to India
     }
-    headers = {
-        "User-Agent": "SmartCityDashboard/Backend-1.0"
-    }
     try:
-        resp = requests.get(NOMINATIM_URL, params=params, headers=headers, timeout=10)
-        resp.raise_for_status()
-        return resp.json()
+        # Retries/backoff and fail-fast when Nominatim is down: see http.UPSTREAMS
+        resp = await http.request("nominatim", "GET", NOMINATIM_URL, params=params)
+        results = resp.json()
+        # Persisting the learned entries touches disk; keep it off the event loop
+        await run_in_threadpool(gazetteer.learn, query, results)
+        return results
     except Exception as e:
         logger.error(f"Nominatim Error: {e}")
         raise HTTPException(status_code=502, detail="Geocoding service unavailable")
 
-def fetch_osm_features(
+# Map feature types to OSM tags
+OSM_TAGS = {
+    "hospital": '"amenity"="hospital"',
+    "police": '"amenity"="police"',
+    "fire_station": '"amenity"="fire_station"',
+    "park": '"leisure"="park"'
+}
+
+# Viewports are snapped to fixed tiles (~11 km, see places.TILE_DEG); each tile's features are
+# stored per type in the place store and refreshed once older than TILE_TTL_S.
+# Wider viewports (country zoom) are answered from what's stored, Overpass only if nothing is
+MAX_TILES = 100
+
+_city_cache = TTLCache(maxsize=256, ttl=TILE_TTL_S)
+_refreshing = set()
+_refresh_tasks = set()   # strong refs so background refreshes aren't garbage-collected
+
+def _build_query(tag_query, area):
+    return f"""
+        [out:json][timeout:25];
+        {area[0]}
+        (
+          node[{tag_query}]({area[1]});
+          way[{tag_query}]({area[1]});
+          relation[{tag_query}]({area[1]});
+        );
+        out center;
+        """
+
+async def _run_overpass(query):
+    resp = await http.request("overpass", "POST", OVERPASS_URL, data={"data": query})
+    return resp.json().get("elements", [])
+
+def _element_to_feature(element, feature_type):
+    lat = element.get("lat") or element.get("center", {}).get("lat")
+    lon = element.get("lon") or element.get("center", {}).get("lon")
+    if not (lat and lon):
+        return None
+    return {
+        "type": "Feature",
+        "properties": {
+            "id": element.get("id"),
+            "name": element.get("tags", {}).get("name", "Unknown"),
+            "type": feature_type,
+            "details": element.get("tags", {})
+        },
+        "geometry": {
+            "type": "Point",
+            "coordinates": [lon, lat]
+        }
+    }
+
+def _features_by_key(elements, feature_type):
+    """OSM elements -> {"node/123": feature}, deduplicated by OSM type and id."""
+    features = {}
+    for element in elements:
+        feat = _element_to_feature(element, feature_type)
+        if feat is not None:
+            features[f"{element.get('type')}/{element.get('id')}"] = feat
+    return features
+
+async def _fetch_tiles(feature_type, tiles):
+    """
+    One Overpass query covering all the given tiles; the result is split back into
+    tiles and stored in the place store (empty tiles too, so they are not re-queried).
+    """
+    rows = [t[0] for t in tiles]
+    cols = [t[1] for t in tiles]
+    edges = (min(rows) * TILE_DEG, min(cols) * TILE_DEG, (max(rows) + 1) * TILE_DEG, (max(cols) + 1) * TILE_DEG)
+    bbox_str = ",".join(f"{round(v, 6)}" for v in edges)
+    tag_query = OSM_TAGS.get(feature_type, OSM_TAGS["hospital"])
+    elements = await _run_overpass(_build_query(tag_query, ("", bbox_str)))
+
+    buckets = {t: {} for t in tiles}
+    for key, feat in _features_by_key(elements, feature_type).items():
+        lon, lat = feat["geometry"]["coordinates"]
+        tile = tile_of(lat, lon)
+        if tile in buckets:
+            buckets[tile][key] = feat
+    try:
+        # Database writes: keep them off the event loop
+        await run_in_threadpool(place_store.ingest, feature_type, buckets)
+    except Exception as e:
+        logger.error(f"Place store ingest Error: {e}")
+    return buckets
+
+async def _refresh_tiles(feature_type, tiles):
+    try:
+        await _fetch_tiles(feature_type, tiles)
+    except Exception as e:
+        logger.error(f"Overpass refresh Error: {e}")
+    finally:
+        for tile in tiles:
+            _refreshing.discard((feature_type,) + tile)
+
+def _schedule_refresh(feature_type, tiles):
+    """Stale-while-revalidate: stale tiles are served now and refetched in the background."""
+    # Runs on the event loop, so check-and-mark needs no lock
+    tiles = [t for t in tiles if (feature_type,) + t not in _refreshing]
+    if not tiles:
+        return
+    _refreshing.update((feature_type,) + t for t in tiles)
+    task = asyncio.get_running_loop().create_task(_refresh_tiles(feature_type, tiles))
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+def prefetch_places(lat, lng, radius_km):
+    """
+    Schedules background fetches for the tiles around a point whose places aren't stored yet
+    (or are older than TILE_TTL_S), so probe lookups never wait on Overpass.
+    """
+    tiles = tiles_around(lat, lng, radius_km)
+    for feature_type in PLACE_TYPES:
+        stale = place_store.stale_tiles(feature_type, tiles)
+        if stale:
+            _schedule_refresh(feature_type, stale)
+
+async def _stored_features(feature_type, bbox):
+    """Stored places in a bbox (spatial index query, off the event loop); {} if the database fails."""
+    try:
+        return await run_in_threadpool(place_store.query_bbox, feature_type, bbox)
+    except Exception as e:
+        logger.error(f"Place store query Error: {e}")
+        return {}
+
+def _in_bbox(feat, bbox):
+    lon, lat = feat["geometry"]["coordinates"]
+    return bbox[0] <= lat <= bbox[2] and bbox[1] <= lon <= bbox[3]
+
+async def fetch_osm_features(
     city_name: str = "New Delhi", 
     feature_type: str = "hospital",
     bbox: tuple = None # (min_lat, min_lng, max_lat, max_lng)
@@ -37,76 +177,58 @@ def fetch_osm_features(
     """
     Fetch features using Overpass API and convert to GeoJSON.
     Supports City Name OR Bounding Box.
+    BBox requests are served from the spatially indexed place table: tiles never stored are
+    fetched first, stale ones are refreshed in the background.
     """
-    # Map feature types to OSM tags
-    tags = {
-        "hospital": '"amenity"="hospital"',
-        "police": '"amenity"="police"',
-        "fire_station": '"amenity"="fire_station"',
-        "park": '"leisure"="park"'
-    }
-    
-    tag_query = tags.get(feature_type, '"amenity"="hospital"')
-    
-    # Construct Query
-    if bbox:
-        # Overpass bbox format: (south, west, north, east) -> (min_lat, min_lng, max_lat, max_lng)
-        bbox_str = f"{bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]}"
-        query = f"""
-        [out:json][timeout:25];
-        (
-          node[{tag_query}]({bbox_str});
-          way[{tag_query}]({bbox_str});
-          relation[{tag_query}]({bbox_str});
-        );
-        out center;
-        """
-    else:
+    tag_query = OSM_TAGS.get(feature_type, OSM_TAGS["hospital"])
+
+    if not bbox:
         # Fallback to City Name
-        query = f"""
-        [out:json][timeout:25];
-        area[name="{city_name}"]->.searchArea;
-        (
-          node[{tag_query}](area.searchArea);
-          way[{tag_query}](area.searchArea);
-          relation[{tag_query}](area.searchArea);
-        );
-        out center;
-        """
-    
-    try:
-        resp = requests.post(OVERPASS_URL, data={"data": query}, timeout=30)
-        resp.raise_for_status()
-        data = resp.json()
-        
-        # Convert to GeoJSON
-        features = []
-        for element in data.get("elements", []):
-            lat = element.get("lat") or element.get("center", {}).get("lat")
-            lon = element.get("lon") or element.get("center", {}).get("lon")
-            
-            if lat and lon:
-                feat = {
-                    "type": "Feature",
-                    "properties": {
-                        "id": element.get("id"),
-                        "name": element.get("tags", {}).get("name", "Unknown"),
-                        "type": feature_type,
-                        "details": element.get("tags", {})
-                    },
-                    "geometry": {
-                        "type": "Point",
-                        "coordinates": [lon, lat]
-                    }
-                }
-                features.append(feat)
-                
-        return {
-            "type": "FeatureCollection",
-            "features": features
-        }
+        cached = _city_cache.get((city_name, feature_type))
+        if cached is not None:
+            return cached
+        try:
+            area = (f'area[name="{city_name}"]->.searchArea;', "area.searchArea")
+            elements = await _run_overpass(_build_query(tag_query, area))
+            result = {"type": "FeatureCollection", "features": list(_features_by_key(elements, feature_type).values())}
+            _city_cache.set((city_name, feature_type), result)
+            return result
+        except Exception as e:
+            logger.error(f"Overpass Error: {e}")
+            # Return empty collection on error to not break frontend
+            return {"type": "FeatureCollection", "features": []}
 
-    except Exception as e:
-        logger.error(f"Overpass Error: {e}")
-        # Return empty collection on error to not break frontend
-        return {"type": "FeatureCollection", "features": []}
+    tiles = tiles_for_bbox(bbox)
+    if len(tiles) > MAX_TILES:
+        # Too wide to tile: whatever is stored, else query the viewport as-is
+        stored = await _stored_features(feature_type, bbox)
+        if stored:
+            return {"type": "FeatureCollection", "features": list(stored.values())}
+        try:
+            # Overpass bbox format: (south, west, north, east) -> (min_lat, min_lng, max_lat, max_lng)
+            bbox_str = f"{bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]}"
+            elements = await _run_overpass(_build_query(tag_query, ("", bbox_str)))
+            return {"type": "FeatureCollection", "features": list(_features_by_key(elements, feature_type).values())}
+        except Exception as e:
+            logger.error(f"Overpass Error: {e}")
+            return {"type": "FeatureCollection", "features": []}
+
+    # Store lookups are in-memory; only tiles never stored wait on Overpass
+    missing = place_store.missing_tiles(feature_type, tiles)
+    stale = [t for t in place_store.stale_tiles(feature_type, tiles) if t not in set(missing)]
+
+    fetched = {}
+    if missing:
+        try:
+            for feats in (await _fetch_tiles(feature_type, missing)).values():
+                fetched.update(feats)
+        except Exception as e:
+            # Serve whatever tiles we already have rather than nothing
+            logger.error(f"Overpass Error: {e}")
+    if stale:
+        _schedule_refresh(feature_type, stale)
+
+    # Just-fetched features are merged in case the store couldn't take them
+    merged = {key: feat for key, feat in fetched.items() if _in_bbox(feat, bbox)}
+    merged.update(await _stored_features(feature_type, bbox))
+    return {"type": "FeatureCollection", "features": list(merged.values())}
@@ -0,0 +1,269 @@
+import os
+import json
+import math
+import time
+import threading
+import logging
+import numpy as np
+from sqlalchemy.dialects import postgresql, sqlite
+from app.db.session import SessionLocal
+from app.db.models import Place, PlaceTile
+from app.db.spatial import places_in_bbox
+from app.services.spatial import NearestIndex
+
+logger = logging.getLogger("uvicorn")
+
+PLACE_TYPES = ("hospital", "police", "fire_station", "park")
+
+# Places are fetched, stored and refreshed per fixed tile (~11 km)
+TILE_DEG = 0.1
+TILE_TTL_S = 6 * 3600
+# Radius probe counts amenities within
+RADIUS_KM = float(os.getenv("PLACES_RADIUS_KM", "2"))
+KM_PER_DEG = 111.32
+# Keeps IN (...) lists and multi-row upserts under SQLite's bound-parameter limit
+CHUNK = 500
+UPSERT_ROWS = 100
+UPSERT_COLUMNS = ("name", "latitude", "longitude", "details")
+
+
+def tile_of(lat, lng):
+    return (math.floor(lat / TILE_DEG), math.floor(lng / TILE_DEG))
+
+
+def tiles_for_bbox(bbox):
+    min_row, min_col = tile_of(bbox[0], bbox[1])
+    max_row, max_col = tile_of(bbox[2], bbox[3])
+    return [(r, c) for r in range(min_row, max_row + 1) for c in range(min_col, max_col + 1)]
+
+
+def tiles_around(lat, lng, radius_km):
+    """Tiles overlapping the square that encloses a radius_km circle around a point."""
+    dlat = radius_km / KM_PER_DEG
+    dlng = radius_km / (KM_PER_DEG * max(math.cos(math.radians(lat)), 0.01))
+    return tiles_for_bbox((lat - dlat, lng - dlng, lat + dlat, lng + dlng))
+
+
+def _chunks(items, size=CHUNK):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _upsert(db, rows):
+    """Bulk INSERT ... ON CONFLICT (type, osm_id) DO UPDATE on SQLite/Postgres; delete + insert elsewhere."""
+    dialect = {"sqlite": sqlite, "postgresql": postgresql}.get(db.get_bind().dialect.name)
+    if dialect is None:
+        for keys in _chunks(row["osm_id"] for row in rows):
+            db.query(Place).filter(Place.type == rows[0]["type"], Place.osm_id.in_(keys)).delete(synchronize_session=False)
+        db.bulk_insert_mappings(Place, rows)
+        return
+    for chunk in _chunks(rows, UPSERT_ROWS):
+        stmt = dialect.insert(Place).values(chunk)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[Place.type, Place.osm_id],
+            set_={col: stmt.excluded[col] for col in UPSERT_COLUMNS},
+        ))
+
+
+def _feature(osm_id, name, lat, lng, details, feature_type):
+    """A stored place as the same GeoJSON feature osm._element_to_feature builds."""
+    return {
+        "type": "Feature",
+        "properties": {
+            "id": int(osm_id.rsplit("/", 1)[1]),
+            "name": name,
+            "type": feature_type,
+            "details": json.loads(details) if details else {}
+        },
+        "geometry": {
+            "type": "Point",
+            "coordinates": [lng, lat]
+        }
+    }
+
+
+class PlaceState:
+    """One consistent view of the store: a NearestIndex per type plus which tiles are stored."""
+
+    def __init__(self, version, indexes, tiles):
+        self.version = version
+        self.indexes = indexes   # type -> NearestIndex
+        self.tiles = tiles       # (type, row, col) -> fetched_at
+
+
+class PlaceStore:
+    """
+    OSM places of the supported types, persisted in the `places` table (spatially indexed,
+    see app.db.spatial) and indexed in memory with a haversine BallTree per type.
+    Overpass tile fetches are ingested here; probe lookups only read the in-memory state,
+    which is swapped whole on every ingest, and bbox queries read the table.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+
+    def state(self):
+        """The current PlaceState, loaded from the database on first use."""
+        state = self._state
+        if state is None:
+            with self._lock:
+                if self._state is None:
+                    self._state = self._load()
+                state = self._state
+        return state
+
+    @property
+    def version(self):
+        return self.state().version
+
+    @staticmethod
+    def _index(db, feature_type):
+        rows = db.query(Place.latitude, Place.longitude).filter(Place.type == feature_type).all()
+        return NearestIndex([r[0] for r in rows], [r[1] for r in rows])
+
+    def _load(self):
+        db = SessionLocal()
+        try:
+            indexes = {t: self._index(db, t) for t in PLACE_TYPES}
+            tiles = {(t.type, t.row, t.col): t.fetched_at for t in db.query(PlaceTile).all()}
+        except Exception as e:
+            logger.error(f"Place store load Error: {e}")
+            indexes, tiles = {}, {}
+        finally:
+            db.close()
+        return PlaceState(1, indexes, tiles)
+
+    def ingest(self, feature_type, buckets):
+        """
+        Replaces the stored places of one type in the fetched tiles with the new features
+        ({tile: {"node/123": feature}}): bulk upsert on (type, osm_id), then delete what's gone.
+        Marks those tiles fetched now.
+        """
+        tiles = set(buckets)
+        features = {key: feat for feats in buckets.values() for key, feat in feats.items()}
+        rows = [t[0] for t in tiles]
+        cols = [t[1] for t in tiles]
+        # Fetched tiles' extent, padded a tile so float edges can't drop a place; tile_of() decides
+        around = ((min(rows) - 1) * TILE_DEG, (min(cols) - 1) * TILE_DEG, (max(rows) + 2) * TILE_DEG, (max(cols) + 2) * TILE_DEG)
+
+        with self._lock:
+            # Taken under the lock so fetch times only grow (probe_cache keys on their max)
+            now = time.time()
+            state = self._state if self._state is not None else self._load()
+            db = SessionLocal()
+            try:
+                # 1. Bulk upsert the fresh features
+                _upsert(db, [
+                    {
+                        "osm_id": key,
+                        "name": feat["properties"]["name"],
+                        "type": feature_type,
+                        "latitude": feat["geometry"]["coordinates"][1],
+                        "longitude": feat["geometry"]["coordinates"][0],
+                        "details": json.dumps(feat["properties"]["details"]),
+                    }
+                    for key, feat in features.items()
+                ])
+
+                # 2. Places stored in these tiles that OSM no longer returns
+                gone = [
+                    row.id for row in places_in_bbox(db, feature_type, around)
+                    if row.osm_id not in features and tile_of(row.latitude, row.longitude) in tiles
+                ]
+                for ids in _chunks(gone):
+                    db.query(Place).filter(Place.id.in_(ids)).delete(synchronize_session=False)
+                for row, col in tiles:
+                    db.merge(PlaceTile(type=feature_type, row=row, col=col, fetched_at=now))
+                db.commit()
+
+                # 3. Swap in a new state with this type re-indexed
+                index = self._index(db, feature_type)
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+
+            tile_times = dict(state.tiles)
+            tile_times.update({(feature_type, row, col): now for row, col in tiles})
+            self._state = PlaceState(state.version + 1, {**state.indexes, feature_type: index}, tile_times)
+
+    def query_bbox(self, feature_type, bbox):
+        """Stored places of one type inside bbox, as {"node/123": feature}, from the spatial index."""
+        db = SessionLocal()
+        try:
+            return {
+                row.osm_id: _feature(row.osm_id, row.name, row.latitude, row.longitude, row.details, feature_type)
+                for row in places_in_bbox(db, feature_type, bbox)
+            }
+        finally:
+            db.close()
+
+    def missing_tiles(self, feature_type, tiles):
+        """Tiles whose places of this type have never been stored."""
+        state = self.state()
+        return [tile for tile in tiles if (feature_type,) + tile not in state.tiles]
+
+    def stale_tiles(self, feature_type, tiles, max_age_s=TILE_TTL_S):
+        """Tiles whose places of this type were never stored, or were fetched over max_age_s ago."""
+        state = self.state()
+        now = time.time()
+        return [
+            tile for tile in tiles
+            if now - state.tiles.get((feature_type,) + tile, -math.inf) > max_age_s
+        ]
+
+    def fetched_around(self, lat, lng, radius_km=RADIUS_KM):
+        """
+        Latest fetch time of the tiles (any type) nearby_many reads for this point, or None if none
+        are stored. Only re-ingesting one of those tiles changes it, unlike the store-wide version.
+        """
+        state = self.state()
+        times = [
+            state.tiles[key] for key in (
+                (feature_type,) + tile for feature_type in PLACE_TYPES for tile in tiles_around(lat, lng, radius_km))
+            if key in state.tiles
+        ]
+        return max(times, default=None)
+
+    def nearby_many(self, lats, lngs, radius_km=RADIUS_KM, state=None):
+        """
+        Per coordinate and type: {"count", "nearest_km"} of stored places within radius_km,
+        or None when the tiles around the point haven't been stored yet for that type.
+        One BallTree radius count and one nearest query per type for the whole batch.
+        """
+        state = self.state() if state is None else state
+        lats = np.atleast_1d(np.asarray(lats, dtype="float64"))
+        lngs = np.atleast_1d(np.asarray(lngs, dtype="float64"))
+        around = [tiles_around(lat, lng, radius_km) for lat, lng in zip(lats.tolist(), lngs.tolist())]
+        results = [{} for _ in range(len(lats))]
+
+        for feature_type in PLACE_TYPES:
+            index = state.indexes.get(feature_type)
+            if index is not None and index.size:
+                counts = index.count_within(lats, lngs, radius_km).tolist()
+                nearest = index.nearest(lats, lngs)[1][:, 0].tolist()
+            else:
+                counts = [0] * len(lats)
+                nearest = [math.inf] * len(lats)
+
+            for result, tiles, count, km in zip(results, around, counts, nearest):
+                covered = all((feature_type,) + tile in state.tiles for tile in tiles)
+                result[feature_type] = {
+                    "count": count,
+                    "nearest_km": round(km, 2) if km <= radius_km else None,
+                } if covered else None
+        return results
+
+    def stats(self):
+        state = self.state()
+        return {
+            "version": state.version,
+            "places": {t: index.size for t, index in state.indexes.items()},
+            "tiles": len(state.tiles),
+        }
+
+
+place_store = PlaceStore()
@@ -0,0 +1,67 @@
+import os
+import datetime
+import threading
+from app.services.cache import TTLCache
+from app.services.datasets import registry
+from app.services.places import place_store
+
+# 3 decimals ~ 110 m: every click inside a cell shares one report
+PRECISION = int(os.getenv("PROBE_CACHE_PRECISION", "3"))
+TTL_S = int(os.getenv("PROBE_CACHE_TTL", "600"))
+MAX_ENTRIES = int(os.getenv("PROBE_CACHE_SIZE", "4096"))
+
+# Datasets a probe report is built from; a change to any of their files changes the key
+DATASETS = ("traffic", "air_quality", "water_quality", "crime")
+
+
+class ProbeCache:
+    """
+    Bounded TTL cache of probe reports keyed on
+    (quantized lat/lng, days, dataset file revisions, fetch time of the place tiles around the cell, today).
+    Reports are computed at the quantized coordinate, so a hit is exactly what a fresh
+    computation would return; old versions simply stop being looked up and age out.
+    """
+
+    def __init__(self, precision=PRECISION, ttl=TTL_S, maxsize=MAX_ENTRIES):
+        self.precision = precision
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.invalidations = 0
+
+    def quantize(self, lat, lng):
+        return round(lat, self.precision), round(lng, self.precision)
+
+    def key(self, lat, lng, days):
+        cell = self.quantize(lat, lng)
+        # revision() only stats the files, so building a key on the event loop never loads a CSV
+        revisions = tuple(registry.revision(name) if registry.exists(name) else None for name in DATASETS)
+        # Places ingested elsewhere leave this cell's reports cached
+        places = place_store.fetched_around(*cell)
+        # Trend windows end today, so the date is part of the key too
+        return (*cell, days, revisions, places, datetime.date.today().isoformat())
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, report):
+        self._cache.set(key, report)
+
+    def invalidate(self):
+        """Drops every cached report (admin hook); returns how many were dropped."""
+        with self._lock:
+            dropped = len(self._cache)
+            self._cache.clear()
+            self.invalidations += 1
+        return dropped
+
+    def stats(self):
+        return {
+            **self._cache.stats(),
+            "precision": self.precision,
+            "ttl_s": self._cache.ttl,
+            "max_entries": self._cache.maxsize,
+            "invalidations": self.invalidations,
+        }
+
+
+probe_cache = ProbeCache()
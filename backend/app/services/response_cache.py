@@ -0,0 +1,168 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from fastapi import Request, Response
+from app.services.datasets import registry
+from app.services.compression import MIN_SIZE, compress, compressible, negotiate
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Total serialized bytes kept, and the largest single body worth keeping
+MAX_BYTES = int(os.getenv("RESPONSE_CACHE_BYTES", 64 * 1024 * 1024))
+MAX_ENTRY_BYTES = 8 * 1024 * 1024
+
+
+class ResponseCache:
+    """
+    LRU of serialized response bodies bounded by total byte size.
+    Compressed variants (gzip/br) are kept next to the identity body once requested.
+    Keys include the dataset file revisions, so a changed file makes old entries unreachable
+    and they age out of the LRU on their own.
+    """
+
+    def __init__(self, max_bytes=MAX_BYTES, max_entry_bytes=MAX_ENTRY_BYTES):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._data = OrderedDict()   # key -> {"etag", "body", "media_type", "variants"}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.not_modified = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    @staticmethod
+    def _size(entry):
+        return len(entry["body"]) + sum(len(v) for v in entry["variants"].values())
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._data:
+            _, evicted = self._data.popitem(last=False)
+            self._bytes -= self._size(evicted)
+
+    def set(self, key, etag, body, media_type):
+        if len(body) > self.max_entry_bytes:
+            return
+        entry = {"etag": etag, "body": body, "media_type": media_type, "variants": {}}
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= self._size(old)
+            self._data[key] = entry
+            self._bytes += len(body)
+            self._evict()
+
+    def add_variant(self, key, encoding, data):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or encoding in entry["variants"]:
+                return
+            entry["variants"][encoding] = data
+            self._bytes += len(data)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        return {
+            "entries": len(self._data), "bytes": self._bytes, "max_bytes": self.max_bytes,
+            "hits": self.hits, "misses": self.misses, "not_modified": self.not_modified,
+        }
+
+
+response_cache = ResponseCache()
+
+
+def _source_digest():
+    """Digest of the app's source files: a deploy that changes any of them changes every ETag."""
+    digest = hashlib.blake2b(digest_size=8)
+    for root, dirs, files in os.walk(APP_DIR):
+        dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+        for name in sorted(files):
+            if name.endswith(".py"):
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, APP_DIR).encode())
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+    return digest.hexdigest()
+
+
+# Part of every cache key and ETag; set APP_BUILD_ID to pin it (e.g. to the release tag)
+BUILD_ID = os.getenv("APP_BUILD_ID") or _source_digest()
+
+
+def _normalize(value):
+    """Canonical form of a query value, so 10, 10.0 and 10.000 share a cache entry."""
+    try:
+        return repr(float(value))
+    except ValueError:
+        return value
+
+
+def cache_key(request: Request, datasets):
+    query = tuple(sorted((k, _normalize(v)) for k, v in request.query_params.multi_items()))
+    # File identity, not the in-process version counter: an ETag must stay valid across restarts and workers
+    versions = tuple((name, registry.revision(name) if registry.exists(name) else None) for name in datasets)
+    return (BUILD_ID, request.url.path, query, versions)
+
+
+def make_etag(key):
+    # Weak: the same entry is served identity or compressed, and a 304 must repeat the 200's tag
+    return 'W/"' + hashlib.blake2b(repr(key).encode(), digest_size=12).hexdigest() + '"'
+
+
+def _matches(if_none_match, etag):
+    """If-None-Match uses weak comparison: W/"x" matches "x"."""
+    for tag in (if_none_match or "").split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag.removeprefix("W/"):
+            return True
+    return False
+
+
+def cached_response(request: Request, datasets, build, media_type="application/json"):
+    """
+    Serves a response whose body depends only on the query and the given datasets.
+    The weak ETag is derived from (build, path, normalized query, dataset file revisions): a matching
+    If-None-Match gets a 304, a cached body is replayed, and only a miss calls build(),
+    which must return the serialized body as bytes.
+    The body is compressed here (once per cached entry and encoding), so the
+    compression middleware passes it through.
+    """
+    key = cache_key(request, datasets)
+    etag = make_etag(key)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if _matches(request.headers.get("if-none-match"), etag):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers={**headers, "Vary": "Accept-Encoding"})
+
+    entry = response_cache.get(key)
+    if entry is None:
+        body = build()
+        response_cache.set(key, etag, body, media_type)
+        variants = {}
+    else:
+        body, media_type, variants = entry["body"], entry["media_type"], entry["variants"]
+
+    encoding = negotiate(request.headers.get("accept-encoding"))
+    if encoding is None or len(body) < MIN_SIZE or not compressible(media_type):
+        return Response(content=body, media_type=media_type, headers=headers)
+
+    data = variants.get(encoding)
+    if data is None:
+        data = compress(body, encoding)
+        response_cache.add_variant(key, encoding, data)
+    headers.update({"Content-Encoding": encoding, "Vary": "Accept-Encoding"})
+    return Response(content=data, media_type=media_type, headers=headers)
@@ -0,0 +1,146 @@
+import datetime
+import numpy as np
+import pandas as pd
+from app.services.datasets import registry
+from app.services.spatial import NearestIndex
+from app.api.traffic import CONGESTION_SCORES
+
+# metric -> (dataset, location key column, value column)
+METRICS = {
+    "aqi": ("air_quality", "StationId", "AQI"),
+    "humidity": ("air_quality", "StationId", "Humidity_Percent"),
+    "traffic": ("traffic", "Location_ID", "congestion"),
+    "water": ("water_quality", "StationCode", "WQI"),
+    "crime": ("crime", "City", "Daily_Incidents"),
+}
+
+# Longest window still served day-by-day, then week-by-week; beyond that monthly
+MAX_DAILY_DAYS = 31
+MAX_WEEKLY_DAYS = 120
+
+
+class SeriesRollup:
+    """
+    Per-location daily series for one metric, with weekly and monthly aggregates precomputed.
+    Rows are locations (nearest found via a BallTree over their centroids); columns are periods.
+    """
+
+    def __init__(self, df, key_col, value_col, date_col="Date"):
+        dates = pd.to_datetime(df[date_col], format="%Y-%m-%d")
+        frame = pd.DataFrame({"key": df[key_col].to_numpy(), "date": dates, "value": df[value_col].to_numpy(dtype="float64", na_value=np.nan)})
+
+        daily = frame.pivot_table(index="date", columns="key", values="value", aggfunc="mean")
+        daily = daily.asfreq("D").ffill().bfill()
+        self.keys = list(daily.columns)
+        self.dates = daily.index
+        self.daily = daily.to_numpy().T
+
+        weekly = daily.resample("W").mean()
+        self.weeks = weekly.index
+        self.weekly = weekly.to_numpy().T
+
+        monthly = daily.resample("MS").mean()
+        self.months = monthly.index
+        self.monthly = monthly.to_numpy().T
+
+        centroids = df.groupby(df[key_col])[["Latitude", "Longitude"]].mean().reindex(self.keys)
+        self.nearest_index = NearestIndex(centroids["Latitude"].to_numpy(), centroids["Longitude"].to_numpy())
+
+    def nearest(self, lat, lng):
+        """Row of the location closest to the coordinate."""
+        positions, _ = self.nearest_index.nearest(lat, lng)
+        return int(positions[0, 0])
+
+    def _window(self, index, values, end, n):
+        stop = int(index.searchsorted(end, side="right"))
+        start = max(0, stop - n)
+        return index[start:stop], values[start:stop]
+
+    def view(self, row, days, end):
+        """
+        (period timestamps, values) for the `days` window ending at `end`.
+        Daily up to MAX_DAILY_DAYS, weekly up to MAX_WEEKLY_DAYS, monthly beyond.
+        """
+        if days <= MAX_DAILY_DAYS:
+            return self._window(self.dates, self.daily[row], end, days)
+        if days <= MAX_WEEKLY_DAYS:
+            return self._window(self.weeks, self.weekly[row], end, max(1, round(days / 7)))
+        return self._window(self.months, self.monthly[row], end, max(1, round(days / 30.44)))
+
+
+def _builder(key_col, value_col):
+    def build(df):
+        if value_col == "congestion":
+            df = df.assign(congestion=df["Avg_Congestion_Level"].map(CONGESTION_SCORES).fillna(0.0))
+        return SeriesRollup(df, key_col, value_col)
+    return build
+
+
+def metric_rollup(metric):
+    dataset, key_col, value_col = METRICS[metric]
+    return registry.derive(dataset, f"rollup_{metric}", _builder(key_col, value_col))
+
+
+def _labels(periods, days):
+    if days == 1:
+        # The datasets are daily: the "24 hours" view is the latest day's reading, dated
+        return [d.strftime("%a %d %b") for d in periods]
+    if days <= 7:
+        return [d.strftime("%a") for d in periods]
+    if days <= MAX_WEEKLY_DAYS:
+        return [d.strftime("%d %b") for d in periods]
+    return [d.strftime("%b") for d in periods]
+
+
+def snapshot():
+    """The current rollup of every metric whose dataset exists, for a consistent multi-point pass."""
+    return {metric: metric_rollup(metric) for metric, (dataset, _, _) in METRICS.items()
+            if registry.exists(dataset)}
+
+
+def _series(rollup, row, days, end):
+    periods, values = rollup.view(row, days, end)
+    return _labels(periods, days), values
+
+
+def trends_many(lats, lngs, days, today=None, rollups=None):
+    """
+    trends() for many coordinates at once: one BallTree query per metric for the whole batch,
+    and each distinct (station, window) series is sliced once however many points share it.
+    rollups: a snapshot() to read from (default: the current one).
+    """
+    today = pd.Timestamp(today or datetime.date.today())
+    rollups = snapshot() if rollups is None else rollups
+    lats = np.atleast_1d(np.asarray(lats, dtype="float64"))
+    lngs = np.atleast_1d(np.asarray(lngs, dtype="float64"))
+    results = [{"days": []} for _ in range(len(lats))]
+
+    for metric in METRICS:
+        rollup = rollups.get(metric)
+        if rollup is None:
+            for result in results:
+                result[metric] = []
+            continue
+        positions, _ = rollup.nearest_index.nearest(lats, lngs)
+        end = min(today, rollup.dates[-1])
+
+        series = {}
+        for result, row in zip(results, positions[:, 0].tolist()):
+            if row not in series:
+                labels, values = _series(rollup, row, days, end)
+                values = values.round(1).tolist() if metric == "crime" else values.round().astype(int).tolist()
+                series[row] = (labels, values)
+            labels, values = series[row]
+            if len(labels) > len(result["days"]):
+                result["days"] = list(labels)
+            result[metric] = list(values)
+    return results
+
+
+def trends(lat, lng, days, today=None):
+    """
+    Trend block for probe.analyze: each metric's series at its nearest station,
+    ending at today (or the last day with data).
+    days=1 gives the single latest daily value (the datasets have no hourly readings).
+    """
+    return trends_many([lat], [lng], days, today=today)[0]
@@ -0,0 +1,253 @@
+import numpy as np
+from sklearn.neighbors import BallTree
+from app.services.datasets import registry
+
+EARTH_RADIUS_KM = 6371.0
+
+# Cells are ~25 km at the equator; wide enough that a city fits in a handful of cells
+DEFAULT_CELL_DEG = 0.25
+# Hard cap on grid size so stray coordinates cannot blow up memory
+MAX_CELLS_PER_AXIS = 2048
+
+
+class GridIndex:
+    """
+    Uniform lat/lng grid over a set of points, stored CSR-style:
+    row positions are sorted by cell id and `_starts[cell]` marks where each cell begins.
+    A bbox query only touches the cells it overlaps, so its cost follows the hits, not the table size.
+    """
+
+    def __init__(self, lats, lngs, cell_deg=DEFAULT_CELL_DEG):
+        self.lats = np.asarray(lats, dtype="float64")
+        self.lngs = np.asarray(lngs, dtype="float64")
+        self.size = len(self.lats)
+
+        valid = np.flatnonzero(~(np.isnan(self.lats) | np.isnan(self.lngs)))
+        if len(valid) == 0:
+            self.cell_deg = cell_deg
+            self.min_lat = self.min_lng = 0.0
+            self.n_rows = self.n_cols = 1
+            self._order = valid
+            self._starts = np.zeros(2, dtype="int64")
+            return
+
+        self.min_lat = float(self.lats[valid].min())
+        self.min_lng = float(self.lngs[valid].min())
+        span = max(float(self.lats[valid].max()) - self.min_lat,
+                   float(self.lngs[valid].max()) - self.min_lng)
+        self.cell_deg = max(cell_deg, span / MAX_CELLS_PER_AXIS)
+
+        rows = self._row(self.lats[valid])
+        cols = self._col(self.lngs[valid])
+        self.n_rows = int(rows.max()) + 1
+        self.n_cols = int(cols.max()) + 1
+
+        cells = rows * self.n_cols + cols
+        order = np.argsort(cells, kind="stable")
+        self._order = valid[order]
+        self._starts = np.searchsorted(cells[order], np.arange(self.n_rows * self.n_cols + 1))
+
+    @classmethod
+    def from_frame(cls, df, lat_col="Latitude", lon_col="Longitude", cell_deg=DEFAULT_CELL_DEG):
+        return cls(df[lat_col].to_numpy(), df[lon_col].to_numpy(), cell_deg=cell_deg)
+
+    def _row(self, lat):
+        return np.floor((lat - self.min_lat) / self.cell_deg).astype("int64")
+
+    def _col(self, lng):
+        return np.floor((lng - self.min_lng) / self.cell_deg).astype("int64")
+
+    def query(self, min_lat, max_lat, min_lng, max_lng):
+        """
+        Returns the row positions (ascending) of points inside the bbox, edges inclusive.
+        """
+        r0 = max(int(self._row(min_lat)), 0)
+        r1 = min(int(self._row(max_lat)), self.n_rows - 1)
+        c0 = max(int(self._col(min_lng)), 0)
+        c1 = min(int(self._col(max_lng)), self.n_cols - 1)
+        if r0 > r1 or c0 > c1 or len(self._order) == 0:
+            return np.empty(0, dtype="int64")
+
+        # Each grid row contributes one contiguous run of the sorted positions
+        chunks = []
+        for r in range(r0, r1 + 1):
+            start = self._starts[r * self.n_cols + c0]
+            end = self._starts[r * self.n_cols + c1 + 1]
+            if end > start:
+                chunks.append(self._order[start:end])
+        if not chunks:
+            return np.empty(0, dtype="int64")
+        candidates = np.concatenate(chunks)
+
+        # Exact test only on the candidates from the overlapped cells
+        lat = self.lats[candidates]
+        lng = self.lngs[candidates]
+        hits = candidates[(lat >= min_lat) & (lat <= max_lat) & (lng >= min_lng) & (lng <= max_lng)]
+        hits.sort()
+        return hits
+
+
+class SummedAreaGrid:
+    """
+    Per-cell sums and counts of one value column, stored as summed-area (prefix-sum) tables,
+    for bbox means without touching the records.
+
+    Cells the bbox covers completely are answered with four corner lookups. Only the cells on
+    the bbox edges are tested point by point, and points are first collapsed to one entry per
+    distinct coordinate (a station's daily rows share one), so the cost does not grow with
+    the number of records.
+    """
+
+    def __init__(self, lats, lngs, values, cell_deg=DEFAULT_CELL_DEG):
+        lats = np.asarray(lats, dtype="float64")
+        lngs = np.asarray(lngs, dtype="float64")
+        values = np.asarray(values, dtype="float64")
+        keep = np.isfinite(lats) & np.isfinite(lngs) & np.isfinite(values)
+        lats, lngs, values = lats[keep], lngs[keep], values[keep]
+
+        # 1. One entry per distinct coordinate
+        coords, inverse = np.unique(np.column_stack([lats, lngs]), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        self.sums = np.bincount(inverse, weights=values, minlength=len(coords))
+        self.counts = np.bincount(inverse, minlength=len(coords)).astype("float64")
+
+        # 2. CSR grid over the distinct coordinates, for the exact edge test
+        self._grid = GridIndex(coords[:, 0], coords[:, 1], cell_deg=cell_deg)
+        grid = self._grid
+
+        # 3. Prefix sums over the cell totals, padded with a zero row/column
+        n_cells = grid.n_rows * grid.n_cols
+        cells = np.zeros(len(coords), dtype="int64")
+        cells[grid._order] = np.repeat(np.arange(n_cells), np.diff(grid._starts))
+        self._sum_table = self._prefix(np.bincount(cells, weights=self.sums, minlength=n_cells), grid)
+        self._count_table = self._prefix(np.bincount(cells, weights=self.counts, minlength=n_cells), grid)
+
+    @classmethod
+    def from_frame(cls, df, value_col, lat_col="Latitude", lon_col="Longitude", cell_deg=DEFAULT_CELL_DEG):
+        return cls(df[lat_col].to_numpy(), df[lon_col].to_numpy(),
+                   df[value_col].to_numpy(dtype="float64", na_value=np.nan), cell_deg=cell_deg)
+
+    @staticmethod
+    def _prefix(cell_totals, grid):
+        table = np.zeros((grid.n_rows + 1, grid.n_cols + 1))
+        table[1:, 1:] = cell_totals.reshape(grid.n_rows, grid.n_cols).cumsum(axis=0).cumsum(axis=1)
+        return table
+
+    @staticmethod
+    def _rect(table, r0, r1, c0, c1):
+        """Total over cells [r0..r1] x [c0..c1] (inclusive) from the padded prefix table."""
+        if r0 > r1 or c0 > c1:
+            return 0.0
+        return float(table[r1 + 1, c1 + 1] - table[r0, c1 + 1] - table[r1 + 1, c0] + table[r0, c0])
+
+    def _edge(self, r, c0, c1, min_lat, max_lat, min_lng, max_lng):
+        """Exact (sum, count) for the points in cells [c0..c1] of grid row r."""
+        grid = self._grid
+        if c0 > c1:
+            return 0.0, 0.0
+        points = grid._order[grid._starts[r * grid.n_cols + c0]:grid._starts[r * grid.n_cols + c1 + 1]]
+        if len(points) == 0:
+            return 0.0, 0.0
+        lat = grid.lats[points]
+        lng = grid.lngs[points]
+        points = points[(lat >= min_lat) & (lat <= max_lat) & (lng >= min_lng) & (lng <= max_lng)]
+        return float(self.sums[points].sum()), float(self.counts[points].sum())
+
+    def query(self, min_lat, max_lat, min_lng, max_lng):
+        """(sum, count) of the values inside the bbox, edges inclusive."""
+        grid = self._grid
+        if grid.size == 0:
+            return 0.0, 0
+        ra, rb = int(grid._row(min_lat)), int(grid._row(max_lat))
+        ca, cb = int(grid._col(min_lng)), int(grid._col(max_lng))
+        r0, r1 = max(ra, 0), min(rb, grid.n_rows - 1)
+        c0, c1 = max(ca, 0), min(cb, grid.n_cols - 1)
+        if r0 > r1 or c0 > c1:
+            return 0.0, 0
+
+        # Cells strictly between the edge rows/columns lie wholly inside the bbox
+        ir0, ir1 = max(ra + 1, 0), min(rb - 1, grid.n_rows - 1)
+        ic0, ic1 = max(ca + 1, 0), min(cb - 1, grid.n_cols - 1)
+        total = self._rect(self._sum_table, ir0, ir1, ic0, ic1)
+        count = self._rect(self._count_table, ir0, ir1, ic0, ic1)
+
+        # Edge cells: whole edge rows, then the edge columns of the interior rows
+        bbox = (min_lat, max_lat, min_lng, max_lng)
+        edges = [(r, c0, c1) for r in {ra, rb} if r0 <= r <= r1]
+        for r in range(max(ir0, r0), min(ir1, r1) + 1):
+            edges += [(r, c, c) for c in {ca, cb} if c0 <= c <= c1]
+        for r, e0, e1 in edges:
+            s, n = self._edge(r, e0, e1, *bbox)
+            total += s
+            count += n
+        return total, int(round(count))
+
+
+class NearestIndex:
+    """
+    Haversine BallTree over point coordinates for nearest-neighbour and radius lookups.
+    Distances are returned in km.
+    """
+
+    def __init__(self, lats, lngs):
+        lats = np.asarray(lats, dtype="float64")
+        lngs = np.asarray(lngs, dtype="float64")
+        # Positions in the source frame; rows without coordinates are left out of the tree
+        self.positions = np.flatnonzero(~(np.isnan(lats) | np.isnan(lngs)))
+        self.size = len(self.positions)
+        coords = np.radians(np.column_stack([lats[self.positions], lngs[self.positions]]))
+        self._tree = BallTree(coords, metric="haversine") if self.size else None
+
+    @classmethod
+    def from_frame(cls, df, lat_col="Latitude", lon_col="Longitude"):
+        return cls(df[lat_col].to_numpy(), df[lon_col].to_numpy())
+
+    def nearest(self, lats, lngs, k=1):
+        """
+        Nearest k points for one or many query coordinates.
+        Returns (positions, distances_km), each shaped (n_queries, k).
+        """
+        query = np.radians(np.column_stack([np.atleast_1d(lats), np.atleast_1d(lngs)]).astype("float64"))
+        if self._tree is None:
+            empty = np.empty((len(query), 0))
+            return empty.astype("int64"), empty
+        dist, idx = self._tree.query(query, k=min(k, self.size))
+        return self.positions[idx], dist * EARTH_RADIUS_KM
+
+    def within(self, lat, lng, radius_km):
+        """Positions and distances (km) of points within radius_km of one coordinate, nearest first."""
+        if self._tree is None:
+            return np.empty(0, dtype="int64"), np.empty(0)
+        query = np.radians([[lat, lng]])
+        idx, dist = self._tree.query_radius(query, r=radius_km / EARTH_RADIUS_KM,
+                                            return_distance=True, sort_results=True)
+        return self.positions[idx[0]], dist[0] * EARTH_RADIUS_KM
+
+    def count_within(self, lats, lngs, radius_km):
+        """Number of points within radius_km of each query coordinate."""
+        query = np.radians(np.column_stack([np.atleast_1d(lats), np.atleast_1d(lngs)]).astype("float64"))
+        if self._tree is None:
+            return np.zeros(len(query), dtype="int64")
+        return self._tree.query_radius(query, r=radius_km / EARTH_RADIUS_KM, count_only=True)
+
+
+def has_bbox(min_lat, max_lat, min_lng, max_lng):
+    return min_lat is not None and max_lat is not None and min_lng is not None and max_lng is not None
+
+
+def dataset_index(name):
+    """Grid index over a registry dataset's Latitude/Longitude, rebuilt once per dataset version."""
+    return registry.derive(name, "grid_index", GridIndex.from_frame)
+
+
+def summary_grid(name, value_col):
+    """Summed-area grid over one column of a registry dataset, rebuilt once per dataset version."""
+    return registry.derive(name, f"summary_{value_col}",
+                           lambda df: SummedAreaGrid.from_frame(df, value_col))
+
+
+def filter_bbox(df, index, min_lat=None, max_lat=None, min_lng=None, max_lng=None):
+    """Rows of df inside the bbox, using an index built over the same frame. No bbox -> df unchanged."""
+    if not has_bbox(min_lat, max_lat, min_lng, max_lng):
+        return df
+    return df.iloc[index.query(min_lat, max_lat, min_lng, max_lng)]
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from app.services import http
+from app.services.cache import TTLCache
+
+logger = logging.getLogger("uvicorn")
+
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+AIR_QUALITY_URL = "https://air-quality-api.open-meteo.com/v1/air-quality"
+
+FORECAST_PARAMS = {
+    "current": "temperature_2m,relative_humidity_2m,surface_pressure,cloud_cover,wind_speed_10m,precipitation",
+    "daily": "temperature_2m_max,temperature_2m_min",
+    "timezone": "auto",
+}
+AIR_QUALITY_PARAMS = {"current": "us_aqi", "timezone": "auto"}
+
+# Open-Meteo's own grid is ~11 km, so a 0.05 deg (~5 km) cell loses nothing
+CELL_DEG = 0.05
+TTL_S = 600
+# Overall deadline for both calls together (per-call timeouts and retries: http.UPSTREAMS).
+# A retry it cuts short still records the timed-out attempt against the breaker.
+DEADLINE_S = 5.0
+
+
+class TelemetryError(Exception):
+    pass
+
+
+_cache = TTLCache(maxsize=2048, ttl=TTL_S)
+
+
+def grid_cell(lat, lng):
+    """Snaps a coordinate to the centre of its CELL_DEG cell."""
+    return (round(round(lat / CELL_DEG) * CELL_DEG, 4), round(round(lng / CELL_DEG) * CELL_DEG, 4))
+
+
+async def _get_json(url, params):
+    resp = await http.request("open-meteo", "GET", url, params=params)
+    return resp.json()
+
+
+async def fetch_telemetry(lat, lng):
+    """
+    Current weather and air-quality readings for a location.
+    Both Open-Meteo calls run concurrently through the shared upstream client; results are cached per grid cell.
+    Returns (weather_data, air_data) or raises TelemetryError.
+    """
+    cell = grid_cell(lat, lng)
+    cached = _cache.get(cell)
+    if cached is not None:
+        return cached
+
+    coords = {"latitude": cell[0], "longitude": cell[1]}
+    try:
+        result = await asyncio.wait_for(asyncio.gather(
+            _get_json(FORECAST_URL, {**coords, **FORECAST_PARAMS}),
+            _get_json(AIR_QUALITY_URL, {**coords, **AIR_QUALITY_PARAMS}),
+        ), timeout=DEADLINE_S)
+    except asyncio.TimeoutError:
+        raise TelemetryError("Open-Meteo did not answer within the deadline")
+    except Exception as e:
+        logger.error(f"Open-Meteo Error: {e}")
+        raise TelemetryError(str(e))
+
+    result = tuple(result)
+    _cache.set(cell, result)
+    return result
+
+
+def cache_stats():
+    return _cache.stats()
@@ -0,0 +1,40 @@
+import os
+import sys
+import glob
+
+# Allow running as `python scripts/convert_columnar.py` from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import columnar
+from app.services.datasets import registry
+from app.services.aqi_history import DTYPE as AQI_HISTORY_DTYPE, aqi_history
+
+def convert_all(force=False):
+    """
+    Converts every backend CSV to its memory-mapped Arrow IPC copy.
+    The server does this lazily on first load as well; running it ahead of time keeps cold starts fast.
+    """
+    if not columnar.available():
+        print("pyarrow is not installed; nothing to do (the backend will keep reading CSV).")
+        return
+
+    # Use the same pinned dtypes as the server's loaders, so the copies match its fingerprint
+    pinned = {os.path.abspath(path): dtype for path, dtype in registry.sources().values()}
+    pinned.update({os.path.abspath(path): AQI_HISTORY_DTYPE for path in aqi_history.files()})
+
+    csv_files = [os.path.join(columnar.PROJECT_DIR, rel) for rel in columnar.SOURCES]
+    csv_files += sorted(glob.glob(os.path.join(columnar.PROJECT_DIR, "data", "aqi_india", "*_combined.csv")))
+
+    for csv_path in csv_files:
+        if not os.path.exists(csv_path):
+            print(f"Skipping missing {csv_path}")
+            continue
+        dtype = pinned.get(os.path.abspath(csv_path))
+        if force:
+            out = columnar.convert(csv_path, dtype=dtype)
+        else:
+            out = columnar.ensure_converted(csv_path, dtype=dtype)
+        print(f"{os.path.relpath(csv_path, columnar.PROJECT_DIR)} -> {out}")
+
+if __name__ == "__main__":
+    convert_all(force="--force" in sys.argv)
@@ -67,12 +67,15 @@ def setup_climate_data():
         encoder_path = os.path.join(MODEL_DIR, "climate_encoder.pkl")
         features_path = os.path.join(MODEL_DIR, "climate_features.pkl")
         
-        with open(model_path, "wb") as f:
-            pickle.dump(model, f)
-        with open(encoder_path, "wb") as f:
-            pickle.dump(label_encoder, f)
-        with open(features_path, "wb") as f:
-            pickle.dump(features, f)
+        # Write every temp file first, then rename them back to back, so a running backend never
+        # unpickles a half-written file and the window with a mixed set is as short as possible
+        # (the model registry also rejects a set whose parts don't match, and retries)
+        artifacts = [(model_path, model), (encoder_path, label_encoder), (features_path, features)]
+        for path, obj in artifacts:
+            with open(path + ".tmp", "wb") as f:
+                pickle.dump(obj, f)
+        for path, _ in artifacts:
+            os.replace(path + ".tmp", path)
             
         print("Model generated successfully and achieves over 99% accuracy on training data.")
         